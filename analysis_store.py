@@ -0,0 +1,194 @@
+import math
+import mmap
+import os
+import struct
+
+try:
+    import fcntl
+except ImportError:  # Windows: no file locks, keep a single writing process there
+    fcntl = None
+
+from evaluation import EVAL_VERSION
+
+# Persistent analysis store
+# A fixed size hash table in a memory-mapped file: the result of every root search (best move, score,
+# depth) stays available to later games and to every process, keyed by the Zobrist key of the position.
+# Layout: a 32 byte header (magic, format version, evaluation version, slot count) then 24 byte slots
+# (key, data, key ^ data). The data word packs the move, depth, bound flag and score (an infinite
+# score as +-SCORE_LIMIT).
+# Readers take no lock: a slot whose check word doesn't match (a write in progress in another
+# process) is a miss. Writers take an exclusive flock on the file.
+# The header carries evaluation.EVAL_VERSION: a store of another evaluation (or size) is replaced by a
+# new empty file, never truncated in place, since other processes may still have the old one mapped.
+
+STORE_MAGIC = b"CCSTORE\0"
+STORE_VERSION = 1
+HEADER = struct.Struct("<8sIIQ8x")
+SLOT = struct.Struct("<QQQ")
+BUCKET_SIZE = 4  # a key may sit in any of the 4 slots after its home slot
+NO_MOVE = 0xFFFF
+SCORE_LIMIT = (1 << 31) - 1  # stored for an infinite score (a won or lost position)
+
+def encode_score(score):
+    if score == math.inf:
+        return SCORE_LIMIT
+    if score == -math.inf:
+        return -SCORE_LIMIT
+    return int(score)
+
+def decode_score(score):
+    if score >= SCORE_LIMIT:
+        return math.inf
+    if score <= -SCORE_LIMIT:
+        return -math.inf
+    return score
+
+def pack_data(move, depth, flag, score):
+    return (move | depth << 16 | flag << 24 | (score & 0xFFFFFFFF) << 32)
+
+def unpack_data(data):
+    score = data >> 32
+    if score >= 1 << 31:
+        score -= 1 << 32
+    return data & 0xFFFF, (data >> 16) & 0xFF, (data >> 24) & 0xFF, score
+
+class AnalysisStore:
+    def __init__(self, path, size_mb=64):
+        self.path = path
+        self.slot_count = max(BUCKET_SIZE, (size_mb << 20) // SLOT.size)
+        expected = HEADER.pack(STORE_MAGIC, STORE_VERSION, EVAL_VERSION, self.slot_count)
+        file_size = HEADER.size + self.slot_count * SLOT.size
+        while True:
+            self.file = open(path, "a+b")
+            self.lock()
+            try:
+                # Replaced by another process since we opened it: open the new one
+                stale = os.fstat(self.file.fileno()).st_ino != os.stat(path).st_ino
+                if not stale:
+                    self.file.seek(0)
+                    header = self.file.read(HEADER.size)
+                    current_size = os.fstat(self.file.fileno()).st_size
+                    if current_size == 0:
+                        # New file: nobody can have mapped it yet, it is set up in place
+                        self.file.write(expected)
+                        self.file.truncate(file_size)
+                        self.file.flush()
+                    elif header != expected or current_size != file_size:
+                        # Other size or other evaluation. Other processes may have the file mapped and
+                        # shrinking it under them would crash them (SIGBUS), so a new empty store replaces
+                        # it (they keep their mapping of the old file until they open the store again)
+                        self.replace_file(expected, file_size)
+                        stale = True
+            finally:
+                self.unlock()
+            if not stale:
+                break
+            self.file.close()
+        self.data = mmap.mmap(self.file.fileno(), 0)
+        self.reset_stats()
+
+    def replace_file(self, header, file_size):
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(header)
+            file.truncate(file_size)
+        os.replace(temporary_path, self.path)
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.torn_reads = 0
+        self.stores = 0
+        self.rejected_stores = 0
+
+    def lock(self):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+
+    def unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def slot_offset(self, index):
+        return HEADER.size + (index % self.slot_count) * SLOT.size
+
+    def probe(self, key):
+        """
+        (packed move or None, depth, flag, score) stored for the key, None if it isn't stored.
+        """
+        self.probes += 1
+        home = key % self.slot_count
+        for i in range(BUCKET_SIZE):
+            slot_key, data, check = SLOT.unpack_from(self.data, self.slot_offset(home + i))
+            if slot_key != key:
+                continue
+            if slot_key ^ data != check:
+                self.torn_reads += 1
+                return None
+            self.hits += 1
+            move, depth, flag, score = unpack_data(data)
+            return (None if move == NO_MOVE else move), depth, flag, decode_score(score)
+        return None
+
+    def store(self, key, move, depth, flag, score):
+        """
+        Depth-preferred: the key's own slot is only overwritten by a deeper (or as deep) result,
+        otherwise an empty slot of the bucket is used, or the shallowest one if it isn't deeper.
+        """
+        data = pack_data(NO_MOVE if move is None else move, depth, flag, encode_score(score))
+        home = key % self.slot_count
+        self.lock()
+        try:
+            target = None
+            shallowest_depth = None
+            for i in range(BUCKET_SIZE):
+                offset = self.slot_offset(home + i)
+                slot_key, slot_data, _ = SLOT.unpack_from(self.data, offset)
+                slot_depth = (slot_data >> 16) & 0xFF
+                if slot_key == key:
+                    target = offset if depth >= slot_depth else None
+                    shallowest_depth = None
+                    break
+                if slot_key == 0 and slot_data == 0:
+                    target, shallowest_depth = offset, -1
+                elif shallowest_depth is None or slot_depth < shallowest_depth:
+                    target, shallowest_depth = offset, slot_depth
+            if shallowest_depth is not None and shallowest_depth > depth:
+                target = None
+            if target is None:
+                self.rejected_stores += 1
+                return False
+            SLOT.pack_into(self.data, target, key, data, key ^ data)
+            self.stores += 1
+            return True
+        finally:
+            self.unlock()
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def stats(self):
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            "torn_reads": self.torn_reads,
+            "stores": self.stores,
+            "rejected_stores": self.rejected_stores,
+        }
+
+_opened_stores = {}
+
+def get_analysis_store(path, size_mb=64):
+    """
+    The store opened once per process and path, None if it can't be opened.
+    A forked worker opens its own file (flock locks are shared by a file opened before the fork).
+    """
+    key = (os.getpid(), path)
+    if key not in _opened_stores:
+        try:
+            _opened_stores[key] = AnalysisStore(path, size_mb)
+        except (OSError, ValueError):
+            _opened_stores[key] = None
+    return _opened_stores[key]
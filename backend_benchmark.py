@@ -0,0 +1,78 @@
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+
+import minimax_algo
+from bit_board_masks import player1_pieces, player2_pieces
+from bit_board_logic import side_moves, play_packed_move
+from engine_pool import EnginePool, use_engine_pool, shutdown_engine_pool, gil_disabled
+from minimax_algo_parallelize import best_move_parallelized, best_move_hybrid, best_move_lazy_smp
+from search_statistics import SearchStats
+from work_stealing import best_move_work_stealing
+
+# Process pool against thread pool (see engine_pool.py) on the same positions:
+#   python backend_benchmark.py --workers 8 --depth 4
+# The thread pool only runs in parallel on a free-threaded CPython without the GIL, elsewhere it
+# shows what the GIL costs. The opening book and the analysis store are turned off so every move
+# is searched.
+
+SEARCHES = {
+    "parallelized": best_move_parallelized,
+    "hybrid": best_move_hybrid,
+    "lazy_smp": best_move_lazy_smp,
+    "work_stealing": best_move_work_stealing,
+}
+
+def benchmark_positions(count, seed=0):
+    """
+    'count' AI to move positions of a few random opening moves (the AI moving forward).
+    """
+    generator = random.Random(seed)
+    positions = []
+    ai, human = player2_pieces, player1_pieces
+    while len(positions) < count:
+        move = generator.choice(side_moves(human, ai | human))
+        _, human = play_packed_move(move, ai | human, human)
+        positions.append((ai, human))
+        move = generator.choice(side_moves(ai, ai | human)[-6:])
+        _, ai = play_packed_move(move, ai | human, ai)
+    return positions
+
+def run_backend(threads, workers, positions, depth, searches):
+    """
+    {search name: (seconds, nodes)} of every search over all the positions.
+    """
+    use_engine_pool(EnginePool(workers, threads=threads)).start()
+    results = {}
+    for name in searches:
+        minimax_algo.clear_search_caches()
+        stats = SearchStats()
+        start = time.perf_counter()
+        for ai, human in positions:
+            SEARCHES[name](ai, human, ai | human, depth, stats=stats)
+        results[name] = (time.perf_counter() - start, stats.nodes)
+    shutdown_engine_pool()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the process and thread backends of the parallel search")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--positions", type=int, default=6)
+    parser.add_argument("--searches", nargs="+", default=list(SEARCHES), choices=list(SEARCHES))
+    args = parser.parse_args()
+
+    minimax_algo.use_opening_book = False
+    minimax_algo.analysis_store_path = None
+    positions = benchmark_positions(args.positions)
+    print(f"Python {sys.version.split()[0]}, GIL {'disabled' if gil_disabled() else 'enabled'}, "
+          f"{args.workers} workers, depth {args.depth}, {len(positions)} positions")
+    backends = {"processes": run_backend(False, args.workers, positions, args.depth, args.searches),
+                "threads": run_backend(True, args.workers, positions, args.depth, args.searches)}
+    print(f"\n{'search':<15}{'backend':<12}{'seconds':>10}{'nodes':>12}{'nodes/s':>12}")
+    for name in args.searches:
+        for backend, results in backends.items():
+            seconds, nodes = results[name]
+            print(f"{name:<15}{backend:<12}{seconds:>10.3f}{nodes:>12}{nodes / seconds:>12,.0f}")
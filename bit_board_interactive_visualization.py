@@ -3,10 +3,17 @@ import time
 import networkx as nx
 import matplotlib.pyplot as plt
 from bit_board_masks import *
-from bit_board_logic import bit_to_index ,extract_bits, moves, play_move, ai_is_winning, human_is_winning
-from minimax_algo import best_move
+from bit_board_logic import bit_to_index ,extract_bits, moves, play_move, ai_is_winning, human_is_winning, encode_move, play_packed_move
 from minimax_algo_parallelize import best_move_hybrid, best_move_parallelized
-from config import verbose
+from minimax_algo import clear_search_caches
+from engine_pool import get_engine_pool, shutdown_engine_pool
+from ponder import Ponderer
+from config import verbose, engine, ai_time_limit_ms, max_search_depth, ponder, ponder_replies
+
+if engine == "numba":
+    from minimax_numba import best_move
+else:
+    from minimax_algo import best_move
 
 def draw_bitboard(ax,
                   occupied_bitboard, 
@@ -162,6 +169,19 @@ def interactive_game(occupied_bitboard, bitboard_player1, bitboard_player2,
     This is an infinite loop until you close the figure or interrupt.
     """
     
+    # Nothing cached from a previous game is useful for this one
+    clear_search_caches()
+    # Start the search workers now, while the human plays the first move
+    get_engine_pool().start()
+
+    # Searches the AI answers to the likely human moves while the human thinks
+    if ponder:
+        # Same search and settings as the AI moves below
+        ponderer = Ponderer(ponder_replies, 4 if ai_time_limit_ms is None else max_search_depth, ai_time_limit_ms,
+                            search=best_move_hybrid)
+    else:
+        ponderer = None
+
     # We'll store the current game state in a dictionary
     game_state = {
         "occupied": occupied_bitboard,
@@ -309,11 +329,11 @@ def interactive_game(occupied_bitboard, bitboard_player1, bitboard_player2,
                 # => perform the move
                 from_piece_mask = game_state["selected_piece_mask"]
                 to_piece_mask   = mask_for_clicked
+                move = encode_move(bit_to_index(from_piece_mask), bit_to_index(to_piece_mask))
 
-                new_occupied, new_current_bb = play_move(from_piece_mask,
-                                                         to_piece_mask,
-                                                         game_state["occupied"],
-                                                         current_bb)
+                new_occupied, new_current_bb = play_packed_move(move,
+                                                                game_state["occupied"],
+                                                                current_bb)
 
                 # Save changes
                 game_state["occupied"] = new_occupied
@@ -365,20 +385,36 @@ def interactive_game(occupied_bitboard, bitboard_player1, bitboard_player2,
         if verbose:
             start = time.perf_counter()
 
+        ponder_hit = False
+        if ponderer is not None:
+            ponder_hit, ai_move = ponderer.take(game_state["p2"], game_state["p1"])
+            if verbose:
+                print("Ponder hit" if ponder_hit else "Ponder miss", ponderer.stats())
+
         # ai_move = best_move(game_state["p2"], game_state["p1"], game_state["occupied"], depth=4, verbose=verbose)
         # ai_move = best_move_parallelized(game_state["p2"], game_state["p1"], game_state["occupied"], depth=4, verbose=verbose)
-        ai_move = best_move_hybrid(game_state["p2"], game_state["p1"], game_state["occupied"], depth=4, verbose=verbose)
+        if ponder_hit:
+            pass
+        elif ai_time_limit_ms is None:
+            ai_move = best_move_hybrid(game_state["p2"], game_state["p1"], game_state["occupied"], depth=4, verbose=verbose)
+        else:
+            ai_move, depth_reached = best_move_hybrid(game_state["p2"], game_state["p1"], game_state["occupied"],
+                                                      depth=max_search_depth, verbose=verbose,
+                                                      time_limit_ms=ai_time_limit_ms)
 
         if verbose:
             end = time.perf_counter()
             print(f"AI move took {end - start:.3f} seconds")
 
-        if ai_move:
-            from_piece_mask, to_piece_mask = ai_move
-            game_state["occupied"], game_state["p2"] = play_move(from_piece_mask, to_piece_mask, game_state["occupied"], game_state["p2"])
+        if ai_move is not None:
+            # ai_move is a packed move (from_index << 7 | to_index)
+            game_state["occupied"], game_state["p2"] = play_packed_move(ai_move, game_state["occupied"], game_state["p2"])
         game_state["turn"] = 1
         redraw()
 
+        if ponderer is not None and not ai_is_winning(game_state["occupied"]):
+            ponderer.start(game_state["p2"], game_state["p1"])
+
         # if ai_is_winning(game_state["occupied"]):
         #     return
 
@@ -391,6 +427,10 @@ def interactive_game(occupied_bitboard, bitboard_player1, bitboard_player2,
     # 5) Show and remain interactive
     plt.show(block=True)
 
+    if ponderer is not None:
+        ponderer.close()
+    shutdown_engine_pool()
+
     # This function loops forever until the figure is closed or kernel interrupted.
 
 if __name__ == "__main__":
@@ -1,85 +1,9 @@
 from bit_board_masks import *
 import ctypes
-from config import use_python_bmi2
-
-# # loading compiled c code
-bmi2 = ctypes.CDLL("./bmi2_bitops.so")
-
-bmi2.pext_native.argtypes = [ctypes.c_uint64, ctypes.c_uint64]
-bmi2.pext_native.restype = ctypes.c_uint64
-
-bmi2.pdep_native.argtypes = [ctypes.c_uint64, ctypes.c_uint64]
-bmi2.pdep_native.restype = ctypes.c_uint64
-
-def pext(source: int, mask: int) -> int:
-    """
-    Calls the PEXT function from the C library on a 128 bit source and mask
-    by splitting them into two 64 bit parts and recombine results.
-    """
-    # Lower part is the first 64 bits, high is the next 64 bits
-    source_low = source & 0xFFFFFFFFFFFFFFFF
-    source_high = (source >> 64) & 0xFFFFFFFFFFFFFFFF
-
-    mask_low = mask & 0xFFFFFFFFFFFFFFFF
-    mask_high = (mask >> 64) & 0xFFFFFFFFFFFFFFFF
-
-    # Call pdep for both
-    extracted_low = bmi2.pext_native(source_low, mask_low)
-    extracted_high = bmi2.pext_native(source_high, mask_high)
-
-    # Counts the amount of 1 in the lower 64 bit mask
-    shift_amount = bin(mask_low).count('1')
-
-    # Combine the two by shifting the high part 64 to the left and or the two lines together
-    result = extracted_low | (extracted_high << shift_amount)
-
-    return result
-
-def pdep(source: int, mask: int) -> int:
-    """
-    Calls the PDEP function from the C library.
-    """
-    # Count the number of 1 bits in the lower mask
-    lower_bit_count = bin(mask & 0xFFFFFFFFFFFFFFFF).count("1")
-
-    # divide the source into what belong in the lower section and higher section
-    source_low = source & ((1 << lower_bit_count) - 1)
-    source_high = source >> lower_bit_count
-
-    # Dividing the mask in two
-    mask_low = mask & 0xFFFFFFFFFFFFFFFF
-    mask_high = (mask >> 64) & 0xFFFFFFFFFFFFFFFF
-
-    # Call C function for lower and upper parts
-    deposited_low = bmi2.pdep_native(source_low, mask_low)
-    deposited_high = bmi2.pdep_native(source_high, mask_high)
-    
-    # Combine the two by shifting the high part 64 to the left and or the two lines together
-    result = deposited_low | (deposited_high << 64)
-
-    return result
-
-def pext_python(source: int, mask: int) -> int:
-    """Pure Python implementation of PEXT"""
-    result = 0
-    bit_pos = 0
-    for i in range(128):
-        if (mask >> i) & 1:
-            if (source >> i) & 1:
-                result |= 1 << bit_pos
-            bit_pos += 1
-    return result
-
-def pdep_python(source: int, mask: int) -> int:
-    """Pure Python implementation of PDEP"""
-    result = 0
-    bit_pos = 0
-    for i in range(128):
-        if (mask >> i) & 1:
-            if (source >> bit_pos) & 1:
-                result |= 1 << i
-            bit_pos += 1
-    return result
+import threading
+from array import array
+from bit_ops import pext, pdep, pext_python, pdep_python, get_backend
+from config import jump_generation
 
 #########################
 # Implementation
@@ -133,19 +57,32 @@ def step_moves(bit_piece, bitboard_occupied):
     return step_move_masks
 
 def intermediate_jump_moves(bit_piece, bitboard_occupied):
+    if jump_generation == "pext":
+        return intermediate_jump_moves_pext(bit_piece, bitboard_occupied)
+    return intermediate_jump_moves_table(bit_piece, bitboard_occupied)
+
+def intermediate_jump_moves_table(bit_piece, bitboard_occupied):
+    piece_index = bit_to_index(bit_piece)
+    # The occupied jump-over squares select the landing squares in the precomputed table,
+    # we only keep the landings that are free
+    occupied_over = bitboard_occupied & jump_over_masks[piece_index]
+    return jump_landing_tables[piece_index][occupied_over] & ~bitboard_occupied
+
+def intermediate_jump_moves_pext(bit_piece, bitboard_occupied, bit_ops=None):
+    # 'bit_ops' can be a bit_ops.BitOpsBackend to use instead of the active one
+    pext_function = bit_ops.pext if bit_ops else pext
+    pdep_function = bit_ops.pdep if bit_ops else pdep
+
     piece_index = bit_to_index(bit_piece)
     # neighbors mask for that piece
     neighbors_mask = jump_over_masks[piece_index]
     # potential jumps mask for that piece
     jumps_mask     = potential_jumps_list[piece_index]
     
-    # Use PEXT to see which neighbor bits are occupied and which jump bits are occupied:
-    if use_python_bmi2:
-        neighbor_compact        = pext_python(bitboard_occupied, neighbors_mask)
-        occupied_jump_compact   = pext_python(bitboard_occupied, jumps_mask)
-    else:
-        neighbor_compact        = pext(bitboard_occupied, neighbors_mask)
-        occupied_jump_compact   = pext(bitboard_occupied, jumps_mask)
+    # Use PEXT to see which neighbor bits are occupied and which jump bits are occupied
+    # (python or c depending on the active bit ops backend, see bit_ops.py):
+    neighbor_compact        = pext_function(bitboard_occupied, neighbors_mask)
+    occupied_jump_compact   = pext_function(bitboard_occupied, jumps_mask)
     
     # "neighbor_compact AND NOT occupied_jump_compact"
     # means "the neighbor is occupied but the jump landing is free"
@@ -153,14 +90,17 @@ def intermediate_jump_moves(bit_piece, bitboard_occupied):
     intermediate_compact = neighbor_compact & (~occupied_jump_compact)
     
     # Now expand it (deposit) back into board space:
-    if use_python_bmi2:
-        intermediate_jump_move_masks = pdep_python(intermediate_compact, jumps_mask)
-    else:
-        intermediate_jump_move_masks = pdep(intermediate_compact, jumps_mask)
+    intermediate_jump_move_masks = pdep_function(intermediate_compact, jumps_mask)
     return intermediate_jump_move_masks
 
-def jump_moves(bit_piece, bitboard_occupied):
-    new_moves_found = intermediate_jump_moves(bit_piece, bitboard_occupied)
+def jump_moves(bit_piece, bitboard_occupied, single_jumps=None):
+    # 'single_jumps' can replace intermediate_jump_moves, e.g. to compare implementations
+    if single_jumps is None:
+        if jump_generation == "flood":
+            return flood_jump_moves(bit_piece, bitboard_occupied)
+        single_jumps = intermediate_jump_moves
+
+    new_moves_found = single_jumps(bit_piece, bitboard_occupied)
     new_move_tracker = new_moves_found  # track everything we've found so far
     
     while new_moves_found:
@@ -168,7 +108,7 @@ def jump_moves(bit_piece, bitboard_occupied):
         new_moves_found = 0
         for position_bit in iterate_bits(new_moves_copy):
             # For each newly found jump position, see if we can jump further
-            further_moves = intermediate_jump_moves(position_bit, bitboard_occupied)
+            further_moves = single_jumps(position_bit, bitboard_occupied)
             # Exclude moves we've already found
             further_moves &= ~new_move_tracker
             # Accumulate
@@ -186,6 +126,130 @@ def moves(bit_piece, bitboard_occupied):
     return all_moves
 
 
+#########################
+# Batch Move Generation
+#########################
+# All the legal moves of a side as packed moves (see Packed Moves below) in an array('H'),
+# pieces and destinations in increasing index order. The c version (side_moves_native in
+# bmi2_bitops.c) does it in a single call, side_moves_python is the reference it is checked against.
+
+MAX_SIDE_MOVES = 10 * 81
+
+def side_moves_python(bitboard_player, bitboard_occupied):
+    return array("H", [encode_move(bit_to_index(piece), bit_to_index(move))
+                       for piece in iterate_bits(bitboard_player)
+                       for move in iterate_bits(moves(piece, bitboard_occupied))])
+
+def split_limbs(bitboard):
+    return bitboard & 0xFFFFFFFFFFFFFFFF, (bitboard >> 64) & 0xFFFFFFFFFFFFFFFF
+
+def limb_table(masks):
+    table = (ctypes.c_uint64 * (2 * len(masks)))()
+    for cell, mask in enumerate(masks):
+        table[2 * cell], table[2 * cell + 1] = split_limbs(mask)
+    return table
+
+native_move_generator = None
+# The c function writes the moves to an output buffer and ctypes releases the GIL during the call:
+# every thread (see engine_pool.py) has its own buffer
+native_move_buffers = threading.local()
+
+def get_native_move_generator():
+    """
+    Returns (c function, mask tables), or None when the bit ops backend in use (config.bit_ops_backend,
+    see bit_ops.get_backend) isn't the compiled code or its .so has no batch generator. Built once per process.
+    """
+    global native_move_generator
+    if native_move_generator is None:
+        backend = get_backend()
+        if backend.name != "native" or not hasattr(backend.library, "side_moves_native"):
+            native_move_generator = False
+        else:
+            tables = (limb_table(neighbors_masks_list), limb_table(jump_over_masks), limb_table(potential_jumps_list))
+            native_move_generator = (backend.library.side_moves_native, tables)
+    return native_move_generator or None
+
+def side_moves_native(bitboard_player, bitboard_occupied):
+    side_moves_c, (neighbors_table, jump_over_table, potential_jumps_table) = get_native_move_generator()
+    moves_out = getattr(native_move_buffers, "moves_out", None)
+    if moves_out is None:
+        moves_out = native_move_buffers.moves_out = (ctypes.c_uint16 * MAX_SIDE_MOVES)()
+    occupied_low, occupied_high = split_limbs(bitboard_occupied)
+    player_low, player_high = split_limbs(bitboard_player)
+    move_count = side_moves_c(occupied_low, occupied_high, player_low, player_high,
+                              neighbors_table, jump_over_table, potential_jumps_table,
+                              moves_out, MAX_SIDE_MOVES)
+    if move_count < 0:
+        return side_moves_python(bitboard_player, bitboard_occupied)
+    move_list = array("H")
+    move_list.frombytes(ctypes.string_at(moves_out, 2 * move_count))
+    return move_list
+
+def side_moves(bitboard_player, bitboard_occupied):
+    if get_native_move_generator() is not None:
+        return side_moves_native(bitboard_player, bitboard_occupied)
+    return side_moves_python(bitboard_player, bitboard_occupied)
+
+
+#########################
+# Shift Layout Move Generation
+#########################
+# Here the whole jump closure is computed with set operations instead of one landing
+# square at a time, using the shift layout from bit_board_masks (see SHIFT_DIRECTIONS).
+
+def to_shift_layout(bitboard):
+    shifted = 0
+    chunk = 0
+    while bitboard:
+        shifted |= to_shift_layout_tables[chunk][bitboard & 0xFF]
+        bitboard >>= 8
+        chunk += 1
+    return shifted
+
+def from_shift_layout(shifted):
+    bitboard = 0
+    chunk = 0
+    while shifted:
+        bitboard |= from_shift_layout_tables[chunk][shifted & 0xFF]
+        shifted >>= 8
+        chunk += 1
+    return bitboard
+
+def flood_jumps(frontier, shifted_occupied):
+    """
+    Given a set of squares 'frontier' and the occupied squares (both in the shift layout),
+    return every square reachable from the frontier with one or more jumps.
+    Each pass moves the whole frontier in the 6 directions at once, we stop at the fixed point.
+    """
+    empty = ~shifted_occupied
+    reached = 0
+    while frontier:
+        landings = 0
+        for amount, _, jump_source_mask in SHIFT_DIRECTIONS:
+            if amount > 0:
+                jumped_over = ((frontier & jump_source_mask) << amount) & shifted_occupied
+                landings |= (jumped_over << amount) & empty
+            else:
+                jumped_over = ((frontier & jump_source_mask) >> -amount) & shifted_occupied
+                landings |= (jumped_over >> -amount) & empty
+        frontier = landings & ~reached
+        reached |= frontier
+    return reached
+
+# The pieces of a side are generated one after the other on the same occupancy, so the last
+# occupancy converted to the shift layout is kept (bitboard, shifted) instead of converting it per piece
+last_shifted_occupied = (None, 0)
+
+def flood_jump_moves(bit_piece, bitboard_occupied):
+    global last_shifted_occupied
+    occupied, shifted_occupied = last_shifted_occupied
+    if occupied != bitboard_occupied:
+        shifted_occupied = to_shift_layout(bitboard_occupied)
+        last_shifted_occupied = (bitboard_occupied, shifted_occupied)
+    piece = index_to_shift_bit[bit_piece.bit_length() - 1]
+    return from_shift_layout(flood_jumps(piece, shifted_occupied))
+
+
 #########################
 # Applying a Move
 #########################
@@ -202,6 +266,36 @@ def play_move(bit_piece, bit_move, bitboard_occupied, bitboard_player):
     new_bitboard_player   = bitboard_player   ^ move_mask
     return new_bitboard_occupied, new_bitboard_player
 
+#########################
+# Packed Moves
+#########################
+# A move is stored as a small int: from_index << 7 | to_index (fits in 14 bits, so an array('H')).
+# This is what the search, the workers and the UI pass around instead of two 81 bit ints.
+
+def encode_move(from_index, to_index):
+    return from_index << 7 | to_index
+
+def decode_move(move):
+    """Returns (from_index, to_index)"""
+    return move >> 7, move & 0x7F
+
+def move_to_bits(move):
+    """Returns (bit_piece, bit_move) as used by play_move"""
+    return 1 << (move >> 7), 1 << (move & 0x7F)
+
+# XOR mask of every packed move, so playing one is a single lookup
+packed_move_masks = [0] * (81 << 7)
+for from_index in range(81):
+    for to_index in range(81):
+        packed_move_masks[encode_move(from_index, to_index)] = (1 << from_index) | (1 << to_index)
+
+def play_packed_move(move, bitboard_occupied, bitboard_player):
+    """
+    Same as play_move, for a packed move.
+    """
+    move_mask = packed_move_masks[move]
+    return bitboard_occupied ^ move_mask, bitboard_player ^ move_mask
+
 def iterate_bits(bit_board: int):
     while bit_board:
         lsb = bit_board & -bit_board
@@ -269,4 +269,90 @@ for length in row_lengths:
         #print(bin(row_mask)[2:].zfill(81))
     ROW_MASKS.append(row_mask)
 
-winning_masks = [player2_pieces,player1_pieces] #first mask is checking is the player 1 is winning (is the player2_pieces full) and vice versa
\ No newline at end of file
+winning_masks = [player2_pieces,player1_pieces] #first mask is checking is the player 1 is winning (is the player2_pieces full) and vice versa
+
+# Jump landing tables
+# The k-th set bit of jump_over_masks[i] is the square jumped over to land on the
+# k-th set bit of potential_jumps_list[i] (this is what the PEXT/PDEP version relies on).
+# For every cell we enumerate all occupancy patterns of its jump-over squares and store
+# the landing squares those patterns open up, so a single hop is one dict lookup:
+#   jump_landing_tables[i][bitboard_occupied & jump_over_masks[i]] & ~bitboard_occupied
+# A cell has at most 6 jump directions, so each table has at most 64 entries.
+
+def _split_bits(mask):
+    bits = []
+    while mask:
+        lsb = mask & -mask
+        bits.append(lsb)
+        mask ^= lsb
+    return bits
+
+jump_pairs_list = [list(zip(_split_bits(over), _split_bits(landing)))
+                   for over, landing in zip(jump_over_masks, potential_jumps_list)]
+
+jump_landing_tables = []
+for pairs in jump_pairs_list:
+    table = {}
+    for pattern in range(1 << len(pairs)):
+        over_bits = 0
+        landing_bits = 0
+        for k, (over, landing) in enumerate(pairs):
+            if (pattern >> k) & 1:
+                over_bits |= over
+                landing_bits |= landing
+        table[over_bits] = landing_bits
+    jump_landing_tables.append(table)
+
+
+# Shift layout
+# The (q, r) coordinates are built the same way as in game_board.generate_two_player_chinese_checkers.
+# The two player board is a 9x9 rhombus in the axial coordinates x = (r + q) / 2, y = (r - q) / 2,
+# so if we store cell (x, y) at bit 9 * y + x every direction becomes a fixed shift.
+# This lets us move a whole set of squares at once instead of one bit at a time.
+
+board_coordinates = []
+for r, length in enumerate(row_lengths):
+    q_start = -(length - 1)
+    for q in range(q_start, -q_start + 1, 2):
+        board_coordinates.append((q, r))
+
+SHIFT_WIDTH = 9
+index_to_shift_bit = [1 << (SHIFT_WIDTH * ((r - q) // 2) + (r + q) // 2) for q, r in board_coordinates]
+shift_position_to_index = {bit.bit_length() - 1: index for index, bit in enumerate(index_to_shift_bit)}
+
+# (dx, dy) in rhombus coordinates and the matching (q, r) move
+# (+1, -1) -> (q+2, r)    (-1, +1) -> (q-2, r)
+# (-1,  0) -> (q-1, r-1)  ( 0, -1) -> (q+1, r-1)
+# ( 0, +1) -> (q-1, r+1)  (+1,  0) -> (q+1, r+1)
+SHIFT_DIRECTIONS = []
+for dx, dy in [(1, -1), (-1, 1), (-1, 0), (0, -1), (0, 1), (1, 0)]:
+    step_source_mask = 0
+    jump_source_mask = 0
+    for x in range(SHIFT_WIDTH):
+        for y in range(SHIFT_WIDTH):
+            bit = 1 << (SHIFT_WIDTH * y + x)
+            if 0 <= x + dx < SHIFT_WIDTH and 0 <= y + dy < SHIFT_WIDTH:
+                step_source_mask |= bit
+            if 0 <= x + 2 * dx < SHIFT_WIDTH and 0 <= y + 2 * dy < SHIFT_WIDTH:
+                jump_source_mask |= bit
+    # (shift amount, squares that have a neighbor in that direction, squares that can jump in that direction)
+    SHIFT_DIRECTIONS.append((SHIFT_WIDTH * dy + dx, step_source_mask, jump_source_mask))
+
+# Converting between the two layouts one byte at a time
+to_shift_layout_tables = []
+from_shift_layout_tables = []
+for chunk in range(11):
+    to_table = []
+    from_table = []
+    for byte in range(256):
+        to_bits = 0
+        from_bits = 0
+        for k in range(8):
+            position = chunk * 8 + k
+            if (byte >> k) & 1 and position < 81:
+                to_bits |= index_to_shift_bit[position]
+                from_bits |= 1 << shift_position_to_index[position]
+        to_table.append(to_bits)
+        from_table.append(from_bits)
+    to_shift_layout_tables.append(to_table)
+    from_shift_layout_tables.append(from_table)
@@ -0,0 +1,145 @@
+import time
+import numpy as np
+
+from bit_board_masks import neighbors_masks_list, jump_pairs_list
+from bit_board_logic import bit_to_index
+
+# Batched move generation with NumPy
+# Boards are given as arrays of (low, high) uint64 limbs, one entry per position, and we compute
+# the move mask of every piece of every position at once. Same moves as bit_board_logic.moves().
+
+CELLS = 81
+LOW_LIMB = (1 << 64) - 1
+
+def to_limbs(bitboards):
+    """
+    List of 81 bit python ints -> (low, high) uint64 arrays.
+    """
+    low = np.array([bitboard & LOW_LIMB for bitboard in bitboards], dtype=np.uint64)
+    high = np.array([bitboard >> 64 for bitboard in bitboards], dtype=np.uint64)
+    return low, high
+
+def from_limbs(low, high):
+    return [int(l) | (int(h) << 64) for l, h in zip(low.ravel(), high.ravel())]
+
+CELL_LOW, CELL_HIGH = to_limbs([1 << cell for cell in range(CELLS)])
+NEIGHBORS_LOW, NEIGHBORS_HIGH = to_limbs(neighbors_masks_list)
+
+# (jumped over cell, landing cell) per cell and direction. Missing directions point at
+# cell 81, an extra column that is never occupied, so they never produce a jump.
+JUMP_OVER = np.full((CELLS, 6), CELLS, dtype=np.int64)
+JUMP_LANDING = np.full((CELLS, 6), CELLS, dtype=np.int64)
+for cell, pairs in enumerate(jump_pairs_list):
+    for k, (over, landing) in enumerate(pairs):
+        JUMP_OVER[cell, k] = bit_to_index(over)
+        JUMP_LANDING[cell, k] = bit_to_index(landing)
+
+def cell_occupancy(low, high):
+    """
+    (N,) limbs -> (N, 82) bool, True where the cell is set (column 81 is always False).
+    """
+    cells = ((low[:, None] & CELL_LOW) | (high[:, None] & CELL_HIGH)) != 0
+    return np.concatenate([cells, np.zeros((len(low), 1), dtype=bool)], axis=1)
+
+def batch_moves(occupied_low, occupied_high, player_low, player_high):
+    """
+    Move masks of every piece of 'player' in every position.
+    Takes (N,) uint64 limb arrays, returns (moves_low, moves_high), both (N, 81):
+    row n, column c is the move mask of the piece on cell c (0 if there is no piece there).
+    """
+    count = len(occupied_low)
+    rows = np.arange(count)
+    occupied = cell_occupancy(occupied_low, occupied_high)
+    empty = ~occupied
+    empty[:, CELLS] = False
+    pieces = cell_occupancy(player_low, player_high)[:, :CELLS]
+
+    # With the occupancy fixed, jumps between empty squares go both ways, so the squares a jump
+    # chain can visit are connected components of the "one jump" graph over the empty squares.
+    # Label every empty square with the smallest index of its component: start with its own index
+    # and take the minimum over its jump neighbors until nothing changes (the fixed point).
+    # One (N, 81) array per direction: can the cell jump that way
+    hops = [occupied[:, JUMP_OVER[:, k]] & empty[:, JUMP_LANDING[:, k]] for k in range(6)]
+    linked = [hop & empty[:, :CELLS] for hop in hops]
+    no_label = np.int8(CELLS)
+    labels = np.where(empty, np.arange(CELLS + 1, dtype=np.int8), no_label)  # (N, 82), column 81 stays no_label
+    while True:
+        new_labels = labels.copy()
+        for k in range(6):
+            neighbor_labels = np.where(linked[k], labels[:, JUMP_LANDING[:, k]], no_label)
+            np.minimum(new_labels[:, :CELLS], neighbor_labels, out=new_labels[:, :CELLS])
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    # Squares of every component, indexed by its label
+    zero = np.uint64(0)
+    component_low = np.zeros((count, CELLS + 1), dtype=np.uint64)
+    component_high = np.zeros((count, CELLS + 1), dtype=np.uint64)
+    for cell in range(CELLS):
+        component_low[rows, labels[:, cell]] |= CELL_LOW[cell]
+        component_high[rows, labels[:, cell]] |= CELL_HIGH[cell]
+    component_low[:, no_label] = zero
+    component_high[:, no_label] = zero
+
+    # A piece reaches the whole component of each of its first jumps
+    jumps_low = np.zeros((count, CELLS), dtype=np.uint64)
+    jumps_high = np.zeros((count, CELLS), dtype=np.uint64)
+    for k in range(6):
+        first_labels = np.where(hops[k], labels[:, JUMP_LANDING[:, k]], no_label)
+        jumps_low |= np.take_along_axis(component_low, first_labels.astype(np.intp), axis=1)
+        jumps_high |= np.take_along_axis(component_high, first_labels.astype(np.intp), axis=1)
+
+    steps_low = NEIGHBORS_LOW & ~occupied_low[:, None]
+    steps_high = NEIGHBORS_HIGH & ~occupied_high[:, None]
+    moves_low = np.where(pieces, steps_low | jumps_low, zero)
+    moves_high = np.where(pieces, steps_high | jumps_high, zero)
+    return moves_low, moves_high
+
+def batch_move_counts(occupied_low, occupied_high, player_low, player_high):
+    """
+    Number of legal moves of 'player' in every position, (N,) array.
+    """
+    moves_low, moves_high = batch_moves(occupied_low, occupied_high, player_low, player_high)
+    return (np.bitwise_count(moves_low) + np.bitwise_count(moves_high)).sum(axis=1)
+
+def random_positions(count, seed=0, pieces_per_side=10):
+    """
+    Random boards with 'pieces_per_side' pieces for each side, as (player1, player2) limb arrays.
+    """
+    rng = np.random.default_rng(seed)
+    player1 = []
+    player2 = []
+    for _ in range(count):
+        cells = rng.choice(CELLS, size=2 * pieces_per_side, replace=False)
+        player1.append(sum(1 << int(cell) for cell in cells[:pieces_per_side]))
+        player2.append(sum(1 << int(cell) for cell in cells[pieces_per_side:]))
+    return to_limbs(player1), to_limbs(player2)
+
+def benchmark(count=2000, check=50):
+    """
+    Positions per second of batch_moves, checked against bit_board_logic.moves on the first 'check' positions.
+    """
+    from bit_board_logic import moves
+
+    (player1_low, player1_high), (player2_low, player2_high) = random_positions(count)
+    occupied_low = player1_low | player2_low
+    occupied_high = player1_high | player2_high
+
+    start = time.perf_counter()
+    moves_low, moves_high = batch_moves(occupied_low, occupied_high, player1_low, player1_high)
+    elapsed = time.perf_counter() - start
+
+    occupied = from_limbs(occupied_low[:check], occupied_high[:check])
+    player1 = from_limbs(player1_low[:check], player1_high[:check])
+    for n in range(check):
+        for cell in range(CELLS):
+            expected = moves(1 << cell, occupied[n]) if (player1[n] >> cell) & 1 else 0
+            found = int(moves_low[n, cell]) | (int(moves_high[n, cell]) << 64)
+            assert found == expected, f"position {n}, cell {cell}: {bin(found)} != {bin(expected)}"
+
+    print(f"{count} positions in {elapsed:.3f} s, {count / elapsed:,.0f} positions/s (checked {check})")
+    return count / elapsed
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,269 @@
+import ctypes
+import json
+import os
+import platform
+import subprocess
+import time
+
+from config import bit_ops_backend
+
+# Bit operation backends
+# PEXT/PDEP can either run in pure python or through the compiled c code (bmi2_bitops.c).
+# Backends are registered by name with a loader, and only loaded the first time they are needed,
+# so importing this module never touches the shared object.
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARED_OBJECT_PATH = os.path.join(MODULE_DIR, "bmi2_bitops.so")
+BACKEND_CACHE_PATH = os.path.join(MODULE_DIR, ".bit_ops_backend.json")
+
+class BitOpsBackend:
+    def __init__(self, name, pext, pdep, library=None):
+        self.name = name
+        self.pext = pext
+        self.pdep = pdep
+        # The loaded ctypes library for native backends, None otherwise
+        self.library = library
+
+    def __repr__(self):
+        return f"BitOpsBackend({self.name!r})"
+
+backend_loaders = {}
+loaded_backends = {}  # name -> BitOpsBackend, or None if it isn't available on this machine
+active_backend = None
+
+def register_backend(name, loader):
+    """
+    Register a backend. 'loader' takes no arguments and returns a BitOpsBackend,
+    or None if the backend can't be used here.
+    """
+    backend_loaders[name] = loader
+    loaded_backends.pop(name, None)
+
+def load_backend(name):
+    if name not in backend_loaders:
+        raise ValueError(f"Unknown bit ops backend {name!r}, expected one of {sorted(backend_loaders)}")
+    if name not in loaded_backends:
+        loaded_backends[name] = backend_loaders[name]()
+    return loaded_backends[name]
+
+def available_backends():
+    return [name for name in backend_loaders if load_backend(name) is not None]
+
+def select_backend(name="auto"):
+    """
+    Make 'name' the active backend. "auto" picks the fastest available backend
+    (see benchmark_backends), a backend that isn't available falls back to python.
+    """
+    global active_backend
+    if name == "auto":
+        name = auto_backend_name()
+    backend = load_backend(name)
+    if backend is None:
+        backend = load_backend("python")
+    active_backend = backend
+    return backend
+
+def get_backend():
+    if active_backend is None:
+        return select_backend(bit_ops_backend)
+    return active_backend
+
+def active_backend_name():
+    return get_backend().name
+
+def pext(source: int, mask: int) -> int:
+    return get_backend().pext(source, mask)
+
+def pdep(source: int, mask: int) -> int:
+    return get_backend().pdep(source, mask)
+
+
+#########################
+# Python backend
+#########################
+
+def pext_python(source: int, mask: int) -> int:
+    """Pure Python implementation of PEXT"""
+    result = 0
+    bit_pos = 0
+    for i in range(128):
+        if (mask >> i) & 1:
+            if (source >> i) & 1:
+                result |= 1 << bit_pos
+            bit_pos += 1
+    return result
+
+def pdep_python(source: int, mask: int) -> int:
+    """Pure Python implementation of PDEP"""
+    result = 0
+    bit_pos = 0
+    for i in range(128):
+        if (mask >> i) & 1:
+            if (source >> bit_pos) & 1:
+                result |= 1 << i
+            bit_pos += 1
+    return result
+
+register_backend("python", lambda: BitOpsBackend("python", pext_python, pdep_python))
+
+
+#########################
+# Native (c) backend
+#########################
+
+def cpu_supports_bmi2():
+    """
+    Check whether the CPU has the BMI2 instructions. On platforms where we can't tell
+    we assume x86-64 has them (every x86-64 CPU since ~2013 does).
+    """
+    machine = platform.machine().lower()
+    if machine not in ("x86_64", "amd64", "i386", "i686", "x86"):
+        return False
+    system = platform.system()
+    try:
+        if system == "Linux":
+            with open("/proc/cpuinfo") as cpuinfo:
+                for line in cpuinfo:
+                    if line.startswith("flags"):
+                        return "bmi2" in line.split()
+            return False
+        if system == "Darwin":
+            features = subprocess.run(["sysctl", "-n", "machdep.cpu.leaf7_features"],
+                                      capture_output=True, text=True).stdout
+            return "BMI2" in features.split()
+    except OSError:
+        pass
+    return True
+
+def load_native_backend():
+    if not cpu_supports_bmi2() or not os.path.exists(SHARED_OBJECT_PATH):
+        return None
+    try:
+        bmi2 = ctypes.CDLL(SHARED_OBJECT_PATH)
+    except OSError:
+        return None
+
+    bmi2.pext_native.argtypes = [ctypes.c_uint64, ctypes.c_uint64]
+    bmi2.pext_native.restype = ctypes.c_uint64
+
+    bmi2.pdep_native.argtypes = [ctypes.c_uint64, ctypes.c_uint64]
+    bmi2.pdep_native.restype = ctypes.c_uint64
+
+    # Batch move generation, missing from shared objects compiled before it was added
+    if hasattr(bmi2, "side_moves_native"):
+        table_pointer = ctypes.POINTER(ctypes.c_uint64)
+        bmi2.side_moves_native.argtypes = [ctypes.c_uint64, ctypes.c_uint64, ctypes.c_uint64, ctypes.c_uint64,
+                                           table_pointer, table_pointer, table_pointer,
+                                           ctypes.POINTER(ctypes.c_uint16), ctypes.c_int]
+        bmi2.side_moves_native.restype = ctypes.c_int
+
+    def pext(source: int, mask: int) -> int:
+        """
+        Calls the PEXT function from the C library on a 128 bit source and mask
+        by splitting them into two 64 bit parts and recombine results.
+        """
+        # Lower part is the first 64 bits, high is the next 64 bits
+        source_low = source & 0xFFFFFFFFFFFFFFFF
+        source_high = (source >> 64) & 0xFFFFFFFFFFFFFFFF
+
+        mask_low = mask & 0xFFFFFFFFFFFFFFFF
+        mask_high = (mask >> 64) & 0xFFFFFFFFFFFFFFFF
+
+        # Call pdep for both
+        extracted_low = bmi2.pext_native(source_low, mask_low)
+        extracted_high = bmi2.pext_native(source_high, mask_high)
+
+        # Counts the amount of 1 in the lower 64 bit mask
+        shift_amount = bin(mask_low).count('1')
+
+        # Combine the two by shifting the high part 64 to the left and or the two lines together
+        result = extracted_low | (extracted_high << shift_amount)
+
+        return result
+
+    def pdep(source: int, mask: int) -> int:
+        """
+        Calls the PDEP function from the C library.
+        """
+        # Count the number of 1 bits in the lower mask
+        lower_bit_count = bin(mask & 0xFFFFFFFFFFFFFFFF).count("1")
+
+        # divide the source into what belong in the lower section and higher section
+        source_low = source & ((1 << lower_bit_count) - 1)
+        source_high = source >> lower_bit_count
+
+        # Dividing the mask in two
+        mask_low = mask & 0xFFFFFFFFFFFFFFFF
+        mask_high = (mask >> 64) & 0xFFFFFFFFFFFFFFFF
+
+        # Call C function for lower and upper parts
+        deposited_low = bmi2.pdep_native(source_low, mask_low)
+        deposited_high = bmi2.pdep_native(source_high, mask_high)
+
+        # Combine the two by shifting the high part 64 to the left and or the two lines together
+        result = deposited_low | (deposited_high << 64)
+
+        return result
+
+    return BitOpsBackend("native", pext, pdep, library=bmi2)
+
+register_backend("native", load_native_backend)
+
+
+#########################
+# Picking the fastest backend
+#########################
+
+def benchmark_backends(repeat=200):
+    """
+    Time every available backend on the masks used by the move generation.
+    Returns {name: seconds}.
+    """
+    from bit_board_masks import jump_over_masks, potential_jumps_list, all_pieces
+
+    timings = {}
+    for name in available_backends():
+        backend = load_backend(name)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for over_mask, jumps_mask in zip(jump_over_masks, potential_jumps_list):
+                compact = backend.pext(all_pieces, over_mask) & ~backend.pext(all_pieces, jumps_mask)
+                backend.pdep(compact, jumps_mask)
+        timings[name] = time.perf_counter() - start
+    return timings
+
+def backend_cache_key():
+    # The cached choice is only valid for the same machine and the same build of the shared object
+    so_mtime = os.path.getmtime(SHARED_OBJECT_PATH) if os.path.exists(SHARED_OBJECT_PATH) else None
+    return {"machine": platform.machine(), "node": platform.node(), "so_mtime": so_mtime}
+
+def auto_backend_name():
+    """
+    Name of the fastest backend. The benchmark runs once and its result is cached
+    in BACKEND_CACHE_PATH so later runs (and pool workers) just read it.
+    """
+    key = backend_cache_key()
+    try:
+        with open(BACKEND_CACHE_PATH) as cache_file:
+            cached = json.load(cache_file)
+        if cached.get("key") == key and load_backend(cached.get("backend", "")) is not None:
+            return cached["backend"]
+    except (OSError, ValueError):
+        pass
+
+    timings = benchmark_backends()
+    fastest = min(timings, key=timings.get)
+    try:
+        with open(BACKEND_CACHE_PATH, "w") as cache_file:
+            json.dump({"key": key, "backend": fastest, "timings": timings}, cache_file)
+    except OSError:
+        pass  # read only install, we'll just benchmark again next time
+    return fastest
+
+if __name__ == "__main__":
+    print("BMI2 supported:", cpu_supports_bmi2())
+    print("Shared object:", SHARED_OBJECT_PATH, "(found)" if os.path.exists(SHARED_OBJECT_PATH) else "(missing)")
+    print("Available backends:", available_backends())
+    for name, seconds in benchmark_backends().items():
+        print(f"{name:>8}: {seconds:.3f} s")
+    print("Active backend:", active_backend_name())
@@ -12,4 +12,108 @@ uint64_t pext_native(uint64_t source, uint64_t mask) {
 // PDEP: Expands bits into 'mask' positions from a compacted bit pattern
 uint64_t pdep_native(uint64_t source, uint64_t mask) {
     return _pdep_u64(source, mask);
-}
\ No newline at end of file
+}
+
+// Batch move generation
+// Same logic as moves() in bit_board_logic.py, but for every piece of a side in one call.
+// Boards are split in two 64 bit limbs: low = bits 0-63, high = bits 64-127.
+// The mask tables are flat arrays of (low, high) limbs per cell: table[2 * cell], table[2 * cell + 1].
+
+typedef struct {
+    uint64_t low;
+    uint64_t high;
+} board128;
+
+// PEXT on 128 bits, the result is small (at most 6 bits for the jump masks)
+static uint64_t pext128(board128 source, board128 mask) {
+    uint64_t extracted_low = _pext_u64(source.low, mask.low);
+    uint64_t extracted_high = _pext_u64(source.high, mask.high);
+    int shift_amount = __builtin_popcountll(mask.low);
+    if (shift_amount == 64) {
+        return extracted_low;
+    }
+    return extracted_low | (extracted_high << shift_amount);
+}
+
+static board128 pdep128(uint64_t source, board128 mask) {
+    board128 deposited;
+    int lower_bit_count = __builtin_popcountll(mask.low);
+    deposited.low = _pdep_u64(source, mask.low);
+    deposited.high = lower_bit_count == 64 ? 0 : _pdep_u64(source >> lower_bit_count, mask.high);
+    return deposited;
+}
+
+static board128 table_entry(const uint64_t *table, int cell) {
+    board128 entry = {table[2 * cell], table[2 * cell + 1]};
+    return entry;
+}
+
+static board128 intermediate_jump_moves(int cell, board128 occupied,
+                                        const uint64_t *jump_over_masks, const uint64_t *potential_jumps) {
+    board128 neighbors_mask = table_entry(jump_over_masks, cell);
+    board128 jumps_mask = table_entry(potential_jumps, cell);
+    // neighbor is occupied but the jump landing is free
+    uint64_t intermediate_compact = pext128(occupied, neighbors_mask) & ~pext128(occupied, jumps_mask);
+    return pdep128(intermediate_compact, jumps_mask);
+}
+
+static int pop_lowest_bit(board128 *board) {
+    int index;
+    if (board->low) {
+        index = __builtin_ctzll(board->low);
+        board->low &= board->low - 1;
+    } else {
+        index = 64 + __builtin_ctzll(board->high);
+        board->high &= board->high - 1;
+    }
+    return index;
+}
+
+// Writes the packed moves (from index << 7 | to index, see encode_move in bit_board_logic.py) into 'moves_out',
+// pieces and destinations in increasing index order. Returns the number of moves, or -1 if more than 'max_moves'.
+int side_moves_native(uint64_t occupied_low, uint64_t occupied_high,
+                      uint64_t player_low, uint64_t player_high,
+                      const uint64_t *neighbors_masks, const uint64_t *jump_over_masks,
+                      const uint64_t *potential_jumps, uint16_t *moves_out, int max_moves) {
+    board128 occupied = {occupied_low, occupied_high};
+    board128 pieces = {player_low, player_high};
+    int move_count = 0;
+
+    while (pieces.low || pieces.high) {
+        int piece = pop_lowest_bit(&pieces);
+
+        // Single steps to empty neighbors
+        board128 neighbors = table_entry(neighbors_masks, piece);
+        board128 all_moves = {neighbors.low & ~occupied.low, neighbors.high & ~occupied.high};
+
+        // Jump chain, same as jump_moves()
+        board128 new_moves_found = intermediate_jump_moves(piece, occupied, jump_over_masks, potential_jumps);
+        board128 new_move_tracker = new_moves_found;
+        while (new_moves_found.low || new_moves_found.high) {
+            board128 frontier = new_moves_found;
+            new_moves_found.low = 0;
+            new_moves_found.high = 0;
+            while (frontier.low || frontier.high) {
+                int position = pop_lowest_bit(&frontier);
+                board128 further_moves = intermediate_jump_moves(position, occupied, jump_over_masks, potential_jumps);
+                further_moves.low &= ~new_move_tracker.low;
+                further_moves.high &= ~new_move_tracker.high;
+                new_moves_found.low |= further_moves.low;
+                new_moves_found.high |= further_moves.high;
+                new_move_tracker.low |= further_moves.low;
+                new_move_tracker.high |= further_moves.high;
+            }
+        }
+        all_moves.low |= new_move_tracker.low;
+        all_moves.high |= new_move_tracker.high;
+
+        while (all_moves.low || all_moves.high) {
+            if (move_count >= max_moves) {
+                return -1;
+            }
+            moves_out[move_count] = (uint16_t)(piece << 7 | pop_lowest_bit(&all_moves));
+            move_count++;
+        }
+    }
+    return move_count;
+}
@@ -1,5 +1,76 @@
-# Set this to false to use compiled c code
-use_python_bmi2 = True
+# Which PEXT/PDEP implementation to use (see bit_ops.py):
+# "python" pure python, "native" compiled c code (falls back to python if the .so or BMI2 is missing),
+# "auto" benchmarks the available ones on first run and caches the fastest
+bit_ops_backend = "auto"
+
+# How jump moves are generated:
+# "table" uses the per-cell jump landing tables (no c code needed)
+# "pext" uses PEXT/PDEP (python or c depending on bit_ops_backend)
+# "flood" computes the whole jump chain at once with board-wide shifts. In pure python it is slower than
+# "table" (perft 4: about 470k against 840k nodes/s, the layout conversions cost more than the chain
+# walk saves), it is kept as a cross-check of the other generators (see perft.py)
+jump_generation = "table"
+
+# Search engine used by the AI:
+# "python" minimax_algo, "numba" minimax_numba (compiled, needs numba, first move compiles for a few seconds)
+engine = "python"
+
+# Play the first moves from opening_book.bin when it exists (build it with "python opening_book.py")
+use_opening_book = True
+
+# File of the analysis store shared by all games and processes (see analysis_store.py), None to turn it off.
+# Searched positions are kept there and replayed when the same position comes back at the same depth
+analysis_store_path = None
+analysis_store_mb = 64
+
+# Once the two armies have passed each other, play the race with the exact solver of race_solver.py.
+# It gives up after race_node_budget positions (then the normal search plays the move)
+use_race_solver = True
+race_node_budget = 200_000
+
+# Time budget of an AI move in milliseconds, None searches the fixed depth 4.
+# With a budget the AI deepens iteratively (up to max_search_depth) and plays the deepest finished search
+ai_time_limit_ms = None
+max_search_depth = 12
+
+# Ponder: while the human thinks, search the AI answers to the ponder_replies most likely human moves
+# in background processes (see ponder.py), a predicted human move is answered right away
+ponder = False
+ponder_replies = 4
+
+# Workers of the parallel searches (see engine_pool.py): "processes", "threads", or "auto" for threads on a
+# free-threaded CPython running without the GIL and processes otherwise
+parallel_backend = "auto"
+
+# best_move_hybrid: after a depth 2 search of every move, the best hybrid_min_moves moves are searched deep,
+# plus the next ones within hybrid_margin of the best depth 2 score (hybrid_max_moves at most).
+# The pruned moves are searched deep afterwards anyway, against the deep result (most fail low at once)
+hybrid_min_moves = 5
+hybrid_max_moves = 12
+hybrid_margin = 2
+
+# Search workers on other machines for distributed_search.best_move_distributed, as "host:port" strings
+# (start them with "python distributed_search.py worker --port 5000"). A worker that doesn't answer a task
+# within remote_task_timeout seconds is skipped and the task is sent to another one
+remote_workers = []
+remote_task_timeout = 30.0
 
 # Set this to True to se stats for AI move
-verbose=False
\ No newline at end of file
+verbose=False
+
+# Transposition table for minimax_algo (see transposition_table.py), the size is a number of buckets
+# (power of two, each bucket holds two positions)
+use_transposition_table = True
+transposition_table_size = 1 << 18
+
+# Size in MB of the evaluation cache (see eval_cache.py), 0 turns it off.
+# The search updates the score move by move and a full evaluation costs about as much as a cache
+# lookup, so it is off by default, turn it on for a slower evaluation
+eval_cache_mb = 0
+
+# Chunk size in bits of the lookup tables that score a whole board (see evaluation.py): 8 or 16
+# (16 is fewer lookups but builds 65536 entry tables on import)
+eval_chunk_bits = 8
+
+# Killer moves, history and row gain move ordering for minimax_algo (see move_ordering.py)
+use_move_ordering = True
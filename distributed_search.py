@@ -0,0 +1,395 @@
+import argparse
+import math
+import multiprocessing
+import selectors
+import socket
+import socketserver
+import struct
+import time
+from array import array
+from collections import deque
+
+from bit_board_masks import player1_pieces, player2_pieces
+from bit_board_logic import side_moves, play_packed_move
+from minimax_algo import instant_move, record_search
+from minimax_algo_parallelize import minimax_wrapper, split_moves
+from shared_transposition_table import encode_score, decode_score
+from search_statistics import SearchStats
+from config import remote_workers, remote_task_timeout
+
+# Distributed search
+# Root move batches (the minimax_wrapper tasks of minimax_algo_parallelize) sent to worker processes
+# over TCP, on this machine or others. A worker is "python distributed_search.py worker --port N",
+# it serves one connection at a time and answers every task with the scores and search counters.
+#
+# Every message is a 4 byte big-endian length then the payload:
+#   task:   type 1, task id, depth, time budget in ms (NO_BUDGET for none), the two 81 bit boards
+#           (16 bytes each) and the packed moves (2 bytes each)
+#   result: type 2, task id, status (0 done, 1 out of time), the scores (4 bytes each, infinite
+#           scores as in analysis_store.py) and the SearchStats as JSON
+#
+# The dispatcher (RemotePool) keeps one connection per worker and sends a task to every idle one.
+# A worker that doesn't answer within the task timeout, or whose connection breaks, is dropped for
+# RETRY_AFTER seconds and its task goes to another worker; after MAX_ATTEMPTS (or with no worker
+# left) the task is searched here.
+
+LENGTH = struct.Struct("!I")
+TASK = struct.Struct("!BIBI16s16sH")
+RESULT = struct.Struct("!BIBH")
+TASK_MESSAGE = 1
+RESULT_MESSAGE = 2
+DONE = 0
+OUT_OF_TIME = 1
+NO_BUDGET = 0xFFFFFFFF
+MAX_ATTEMPTS = 3
+RETRY_AFTER = 5.0
+
+
+#########################
+# Protocol
+#########################
+
+def encode_task(task_id, bitboard_player, bitboard_opponent, depth, move_list, time_budget=None):
+    budget = NO_BUDGET if time_budget is None else max(0, int(time_budget * 1000))
+    payload = (TASK.pack(TASK_MESSAGE, task_id, depth, budget, bitboard_player.to_bytes(16, "big"),
+                         bitboard_opponent.to_bytes(16, "big"), len(move_list))
+               + struct.pack(f"!{len(move_list)}H", *move_list))
+    return LENGTH.pack(len(payload)) + payload
+
+def decode_task(payload):
+    """
+    (task id, minimax_wrapper arguments) of a task payload.
+    """
+    kind, task_id, depth, budget, player_bytes, opponent_bytes, count = TASK.unpack_from(payload)
+    if kind != TASK_MESSAGE:
+        raise ValueError(f"not a task message: {kind}")
+    move_list = array("H", struct.unpack_from(f"!{count}H", payload, TASK.size))
+    time_budget = None if budget == NO_BUDGET else budget / 1000
+    return task_id, (int.from_bytes(player_bytes, "big"), int.from_bytes(opponent_bytes, "big"),
+                     depth, move_list, time_budget)
+
+def encode_result(task_id, scores, stats):
+    status = OUT_OF_TIME if scores is None else DONE
+    scores = scores or []
+    payload = (RESULT.pack(RESULT_MESSAGE, task_id, status, len(scores))
+               + struct.pack(f"!{len(scores)}i", *map(encode_score, scores))
+               + stats.to_json().encode())
+    return LENGTH.pack(len(payload)) + payload
+
+def decode_result(payload):
+    """
+    (task id, scores or None if the worker ran out of time, SearchStats) of a result payload.
+    """
+    kind, task_id, status, count = RESULT.unpack_from(payload)
+    if kind != RESULT_MESSAGE:
+        raise ValueError(f"not a result message: {kind}")
+    scores = [decode_score(score) for score in struct.unpack_from(f"!{count}i", payload, RESULT.size)]
+    stats = SearchStats.from_json(payload[RESULT.size + 4 * count:].decode())
+    return task_id, (None if status == OUT_OF_TIME else scores), stats
+
+def read_message(stream):
+    """
+    Next payload of a blocking stream, None at the end of the stream.
+    """
+    header = stream.read(LENGTH.size)
+    if len(header) < LENGTH.size:
+        return None
+    length, = LENGTH.unpack(header)
+    payload = stream.read(length)
+    return payload if len(payload) == length else None
+
+def take_message(buffer):
+    """
+    Remove and return the first complete payload of a bytearray, None if it isn't all there yet.
+    """
+    if len(buffer) < LENGTH.size:
+        return None
+    length, = LENGTH.unpack_from(buffer)
+    if len(buffer) < LENGTH.size + length:
+        return None
+    payload = bytes(buffer[LENGTH.size:LENGTH.size + length])
+    del buffer[:LENGTH.size + length]
+    return payload
+
+
+#########################
+# Worker
+#########################
+
+class SearchRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            payload = read_message(self.rfile)
+            if payload is None:
+                return
+            task_id, args = decode_task(payload)
+            scores, stats = minimax_wrapper(args)
+            try:
+                self.wfile.write(encode_result(task_id, scores, stats))
+            except OSError:
+                return  # The dispatcher gave up on this task
+
+class SearchServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+def serve(host="0.0.0.0", port=5000, ready=None):
+    """
+    Run a worker until killed. 'ready' (a multiprocessing queue) receives the port once listening.
+    """
+    with SearchServer((host, port), SearchRequestHandler) as server:
+        if ready is not None:
+            ready.put(server.server_address[1])
+        server.serve_forever()
+
+def start_local_workers(count, host="127.0.0.1"):
+    """
+    'count' worker processes on free ports of this machine: (processes, ["host:port", ...]).
+    """
+    ready = multiprocessing.Queue()
+    processes = []
+    for _ in range(count):
+        process = multiprocessing.Process(target=serve, args=(host, 0, ready), daemon=True)
+        process.start()
+        processes.append(process)
+    addresses = [f"{host}:{ready.get(timeout=30)}" for _ in processes]
+    return processes, addresses
+
+def stop_local_workers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+#########################
+# Dispatcher
+#########################
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+class RemotePool:
+    """
+    Connections to the workers at 'addresses' ("host:port" strings), opened on first use and kept.
+    run() has the tasks searched and returns their results in order.
+    """
+    def __init__(self, addresses, task_timeout=30.0, connect_timeout=2.0):
+        self.addresses = [parse_address(address) for address in addresses]
+        self.task_timeout = task_timeout
+        self.connect_timeout = connect_timeout
+        self.connections = {}  # address -> socket
+        self.down_until = {}  # address -> time.monotonic() before which it isn't tried again
+        self.tasks = 0
+        self.redispatched = 0
+        self.timeouts = 0
+        self.local_tasks = 0
+
+    def connection(self, address):
+        """
+        The open socket to a worker, None if it is down.
+        """
+        if address in self.connections:
+            return self.connections[address]
+        if time.monotonic() < self.down_until.get(address, 0):
+            return None
+        try:
+            sock = socket.create_connection(address, timeout=self.connect_timeout)
+        except OSError:
+            self.down_until[address] = time.monotonic() + RETRY_AFTER
+            return None
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(None)
+        self.connections[address] = sock
+        return sock
+
+    def drop(self, address):
+        sock = self.connections.pop(address, None)
+        if sock is not None:
+            sock.close()
+        self.down_until[address] = time.monotonic() + RETRY_AFTER
+
+    def run(self, tasks):
+        """
+        tasks: minimax_wrapper arguments (bitboard_player, bitboard_opponent, depth, move_list[, time_budget]).
+        Returns the (scores, SearchStats) of every task, in order.
+        """
+        results = [None] * len(tasks)
+        attempts = [0] * len(tasks)
+        pending = deque(range(len(tasks)))
+        in_flight = {}  # socket -> [task index, deadline, receive buffer, address]
+        selector = selectors.DefaultSelector()
+        self.tasks += len(tasks)
+
+        def retry(sock):
+            index, _, _, address = in_flight.pop(sock)
+            selector.unregister(sock)
+            self.drop(address)
+            self.redispatched += 1
+            pending.appendleft(index)
+
+        try:
+            while pending or in_flight:
+                # Hand a task to every idle worker
+                for address in self.addresses:
+                    if not pending:
+                        break
+                    sock = self.connection(address)
+                    if sock is None or sock in in_flight:
+                        continue
+                    index = pending[0]
+                    if attempts[index] >= MAX_ATTEMPTS:
+                        break
+                    bitboard_player, bitboard_opponent, depth, move_list = tasks[index][:4]
+                    time_budget = tasks[index][4] if len(tasks[index]) > 4 else None
+                    try:
+                        sock.sendall(encode_task(index, bitboard_player, bitboard_opponent, depth, move_list,
+                                                 time_budget))
+                    except OSError:
+                        self.drop(address)
+                        continue
+                    pending.popleft()
+                    attempts[index] += 1
+                    in_flight[sock] = [index, time.monotonic() + self.task_timeout, bytearray(), address]
+                    selector.register(sock, selectors.EVENT_READ)
+
+                if not in_flight:
+                    # No worker to take it (all down, or the task failed too often): search it here
+                    index = pending.popleft()
+                    results[index] = minimax_wrapper(tasks[index])
+                    self.local_tasks += 1
+                    continue
+
+                timeout = max(0.0, min(entry[1] for entry in in_flight.values()) - time.monotonic())
+                for key, _ in selector.select(timeout):
+                    sock = key.fileobj
+                    try:
+                        chunk = sock.recv(1 << 16)
+                    except OSError:
+                        chunk = b""
+                    if not chunk:
+                        retry(sock)
+                        continue
+                    entry = in_flight[sock]
+                    entry[2] += chunk
+                    payload = take_message(entry[2])
+                    if payload is not None:
+                        task_id, scores, stats = decode_result(payload)
+                        results[task_id] = (scores, stats)
+                        del in_flight[sock]
+                        selector.unregister(sock)
+
+                now = time.monotonic()
+                for sock in [sock for sock, entry in in_flight.items() if entry[1] < now]:
+                    self.timeouts += 1
+                    retry(sock)
+        finally:
+            # Connections with an unfinished task can't be reused (its answer would still come)
+            for sock, entry in in_flight.items():
+                selector.unregister(sock)
+                self.drop(entry[3])
+            selector.close()
+        return results
+
+    def close(self):
+        for address in list(self.connections):
+            self.connections.pop(address).close()
+
+    def stats(self):
+        return {"workers": len(self.addresses), "connected": len(self.connections), "tasks": self.tasks,
+                "redispatched": self.redispatched, "timeouts": self.timeouts, "local_tasks": self.local_tasks}
+
+_remote_pool = None
+
+def get_remote_pool():
+    """
+    The pool of the workers listed in config.remote_workers.
+    """
+    global _remote_pool
+    if _remote_pool is None:
+        _remote_pool = RemotePool(remote_workers, remote_task_timeout)
+    return _remote_pool
+
+def best_move_distributed(bitboard_player, bitboard_opponent, bitboard_occupied, depth=4, verbose=False,
+                          stats=None, pool=None):
+    """
+    Every root move searched by the workers of 'pool' (a RemotePool, config.remote_workers by default),
+    a few batches per worker. The counters of all the workers are added to 'stats' when one is passed.
+    """
+    start = time.perf_counter()
+    pool = pool or get_remote_pool()
+    if stats is None:
+        stats = SearchStats()
+
+    known = instant_move(bitboard_player, bitboard_opponent, verbose, depth)
+    if known is not None:
+        stats.depth_reached = known[1]
+        stats.race_distance = known[2]
+        return known[0]
+
+    batches = split_moves(side_moves(bitboard_player, bitboard_occupied), 4 * max(1, len(pool.addresses)))
+    results = pool.run([(bitboard_player, bitboard_opponent, depth, batch) for batch in batches])
+
+    best_score = -math.inf
+    best_move_choice = None
+    for batch, (scores, batch_stats) in zip(batches, results):
+        for move, score in zip(batch, scores):
+            if score > best_score:
+                best_score = score
+                best_move_choice = move
+        stats.merge(batch_stats)
+
+    stats.elapsed += time.perf_counter() - start
+    stats.iteration_times.append([depth, time.perf_counter() - start])
+    stats.depth_reached = depth
+    record_search(bitboard_player, bitboard_opponent, best_move_choice, best_score, depth)
+    if verbose:
+        print()
+        print("Distributed search stats:", stats.to_json())
+        print("Workers:", pool.stats())
+    return best_move_choice
+
+def test_position():
+    """
+    Start position after the first human move, the AI to move.
+    """
+    bitboard_occupied = player1_pieces | player2_pieces
+    _, human = play_packed_move(side_moves(player1_pieces, bitboard_occupied)[0], bitboard_occupied, player1_pieces)
+    return player2_pieces, human
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed search workers")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subparsers.add_parser("worker", help="run a search worker")
+    worker_parser.add_argument("--host", default="0.0.0.0")
+    worker_parser.add_argument("--port", type=int, default=5000)
+    local_parser = subparsers.add_parser("local", help="search the test position with worker processes on this machine")
+    local_parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    local_parser.add_argument("--depth", type=int, default=4)
+    search_parser = subparsers.add_parser("search", help="search the test position with running workers")
+    search_parser.add_argument("addresses", nargs="+", help="host:port of every worker")
+    search_parser.add_argument("--depth", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        serve(args.host, args.port)
+    else:
+        from minimax_algo import best_move
+        processes = []
+        if args.command == "local":
+            processes, addresses = start_local_workers(args.workers)
+        else:
+            addresses = args.addresses
+        remote_pool = RemotePool(addresses, remote_task_timeout)
+        try:
+            ai, human = test_position()
+            start = time.perf_counter()
+            move = best_move_distributed(ai, human, ai | human, args.depth, verbose=True, pool=remote_pool)
+            distributed_time = time.perf_counter() - start
+            start = time.perf_counter()
+            serial_move = best_move(ai, human, ai | human, args.depth)
+            serial_time = time.perf_counter() - start
+            print(f"\nDistributed: move {move} in {distributed_time:.3f} s, serial: move {serial_move} in {serial_time:.3f} s")
+        finally:
+            remote_pool.close()
+            stop_local_workers(processes)
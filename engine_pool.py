@@ -0,0 +1,178 @@
+import atexit
+import math
+import multiprocessing
+import os
+import sys
+from multiprocessing import resource_tracker
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from shared_transposition_table import SharedTranspositionTable, detach_shared_tables
+from config import parallel_backend
+
+# Warm engine pool
+# The parallel searches used to start a new ProcessPoolExecutor on every AI move: process startup,
+# imports and table building every move, and the transposition table, move ordering and evaluation
+# cache of the workers thrown away with them. The pool is now started once (on first use), its
+# workers build everything up front in warm_worker, and it is kept across moves and games until
+# shutdown_engine_pool() (also called at exit).
+#
+# The pool also owns 'shared_alpha', a double in shared memory read and raised by every worker of a
+# best_move_parallelized search (the best root score found so far, see ybwc_wrapper). It is created
+# with the pool and handed to the workers by the initializer, it can't be sent with the tasks.
+# Likewise the shared transposition table of best_move_lazy_smp belongs to the pool (created on first
+# use, unlinked at shutdown), the workers attach to it by name.
+#
+# On a free-threaded CPython (3.13+ built without the GIL) the pool runs threads instead of processes
+# (config.parallel_backend): nothing is pickled and every worker uses the transposition table, move
+# ordering and evaluation cache of minimax_algo directly. Only the read-only or self-checking state
+# is shared this way: a table entry is a single tuple or 64 bit word written at once and checked
+# against the key on probe, and a lost killer or history update only changes the move order.
+# Scratch state written during a search must be per thread (the output buffer of the native move
+# generator, see bit_board_logic.native_move_buffers). The counters of every task still go to its
+# own SearchStats.
+
+def gil_disabled():
+    """
+    True on a free-threaded build running without the GIL.
+    """
+    return hasattr(sys, "_is_gil_enabled") and not sys._is_gil_enabled()
+
+shared_alpha = None  # in a worker: the pool's shared alpha
+
+def warm_worker(alpha=None):
+    """
+    Pool initializer: keep the shared alpha, import the engine (its tables are built on import) and
+    run a tiny search so the numba functions are compiled before the first real move.
+    """
+    global shared_alpha
+    shared_alpha = alpha
+    from bit_board_masks import player1_pieces, player2_pieces
+    from bit_board_logic import side_moves
+    from minimax_algo_parallelize import minimax_wrapper
+    minimax_wrapper((player2_pieces, player1_pieces, 1, side_moves(player2_pieces, player1_pieces | player2_pieces)[:1]))
+
+class EnginePool:
+    """
+    A ProcessPoolExecutor (ThreadPoolExecutor with 'threads') of warm workers, reused by every search.
+    A pool broken by a dead worker is started again on the next call.
+    """
+    def __init__(self, workers=None, threads=False):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.threads = threads
+        self.pid = os.getpid()  # a forked child inherits the object, not the workers or the table
+        self.executor = None
+        self.shared_alpha = multiprocessing.Value("d", -math.inf)
+        self.table = None
+        self.starts = 0
+        self.tasks = 0
+        self.start_time = 0.0
+
+    def start(self):
+        if self.executor is None:
+            start = time.perf_counter()
+            # Workers started before the resource tracker would run their own, which would unlink the
+            # shared table when they exit
+            resource_tracker.ensure_running()
+            executor_class = ThreadPoolExecutor if self.threads else ProcessPoolExecutor
+            self.executor = executor_class(max_workers=self.workers, initializer=warm_worker,
+                                           initargs=(self.shared_alpha,))
+            # Workers are started lazily by the executor, start them all now
+            for future in [self.executor.submit(time.sleep, 0) for _ in range(self.workers)]:
+                future.result()
+            self.starts += 1
+            self.start_time += time.perf_counter() - start
+        return self.executor
+
+    def map(self, function, all_args):
+        """
+        list(executor.map(function, all_args)) on the warm workers.
+        """
+        all_args = list(all_args)
+        self.tasks += len(all_args)
+        try:
+            return list(self.start().map(function, all_args))
+        except BrokenProcessPool:
+            self.shutdown()
+            return list(self.start().map(function, all_args))
+
+    def submit(self, function, args):
+        """
+        executor.submit(function, args) on the warm workers, a Future.
+        """
+        self.tasks += 1
+        return self.start().submit(function, args)
+
+    def set_alpha(self, value):
+        with self.shared_alpha.get_lock():
+            self.shared_alpha.value = value
+
+    def shared_table(self, size):
+        """
+        The SharedTranspositionTable of the pool (a new one if the size changed).
+        """
+        if self.table is not None and self.table.size != size:
+            self.table.close()
+            self.table = None
+        if self.table is None:
+            self.table = SharedTranspositionTable(size)
+        return self.table
+
+    def shutdown(self):
+        if os.getpid() != self.pid:
+            # Inherited through a fork: the workers and the table belong to the parent
+            self.executor = None
+            self.table = None
+            return
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+            if self.threads:
+                # The worker threads attached the shared table in this process
+                detach_shared_tables()
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+    def stats(self):
+        return {"backend": "threads" if self.threads else "processes", "workers": self.workers,
+                "starts": self.starts, "tasks": self.tasks, "start_time": self.start_time}
+
+_engine_pool = None
+
+def get_engine_pool():
+    """
+    The pool shared by all the searches of this process.
+    """
+    global _engine_pool
+    if _engine_pool is None:
+        _engine_pool = EnginePool(threads=parallel_backend == "threads"
+                                  or (parallel_backend == "auto" and gil_disabled()))
+    return _engine_pool
+
+def use_engine_pool(pool):
+    """
+    Make 'pool' the shared pool (the previous one is shut down), e.g. to compare backends.
+    """
+    global _engine_pool
+    if _engine_pool is not None and _engine_pool is not pool:
+        _engine_pool.shutdown()
+    _engine_pool = pool
+    return pool
+
+def shutdown_engine_pool():
+    global _engine_pool
+    if _engine_pool is not None:
+        _engine_pool.shutdown()
+        _engine_pool = None
+
+def raise_shared_alpha(score):
+    """
+    In a worker: a root move scored 'score', make it the shared alpha if it is the best one yet.
+    """
+    with shared_alpha.get_lock():
+        if score > shared_alpha.value:
+            shared_alpha.value = score
+
+atexit.register(shutdown_engine_pool)
@@ -0,0 +1,93 @@
+from array import array
+
+# Evaluation cache in a flat array('Q') instead of an lru_cache of python ints.
+# A position is hashed to 64 bits, the low bits pick the slot (open addressing with linear probing
+# over PROBE_LENGTH slots) and the slot packs the high 32 bits of the hash, to tell positions
+# sharing a slot apart, with the score: entry = verification << 32 | (score + SCORE_OFFSET).
+# That is 8 bytes per position, so the same memory holds far more positions than the lru_cache,
+# and forked workers share the pages until they write to them.
+
+MASK64 = (1 << 64) - 1
+SCORE_OFFSET = 1 << 31
+PROBE_LENGTH = 4
+
+def position_hash(bitboard_player, bitboard_opponent):
+    """
+    64 bit hash of the two 81 bit boards (multiply, fold and a splitmix64 finalizer).
+    """
+    h = (bitboard_player * 0x9E3779B97F4A7C15) ^ (bitboard_opponent * 0xC2B2AE3D27D4EB4F)
+    h = (h ^ (h >> 64) ^ (h >> 128)) & MASK64
+    h ^= h >> 30
+    h = (h * 0xBF58476D1CE4E5B9) & MASK64
+    h ^= h >> 27
+    h = (h * 0x94D049BB133111EB) & MASK64
+    return h ^ (h >> 31)
+
+class EvalCache:
+    """
+    Fixed size score cache, 'size_mb' megabytes rounded down to a power of two number of slots.
+    """
+    def __init__(self, size_mb=16):
+        slots = max(PROBE_LENGTH, (size_mb << 20) // 8)
+        self.size = 1 << (slots.bit_length() - 1)
+        self.index_mask = self.size - 1
+        self.entries = array("Q", bytes(8 * self.size))
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.lookups = 0
+        self.hits = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def clear(self):
+        """
+        Forget every position (between games) and reset the counters.
+        """
+        self.entries = array("Q", bytes(8 * self.size))
+        self.reset_stats()
+
+    def get(self, bitboard_player, bitboard_opponent):
+        """
+        The cached score, None if the position isn't in the cache.
+        """
+        self.lookups += 1
+        h = position_hash(bitboard_player, bitboard_opponent)
+        verification = (h >> 32) | 1  # Never 0, a 0 entry is an empty slot
+        index = h & self.index_mask
+        entries = self.entries
+        for probe in range(PROBE_LENGTH):
+            entry = entries[(index + probe) & self.index_mask]
+            if entry == 0:
+                return None
+            if entry >> 32 == verification:
+                self.hits += 1
+                return (entry & 0xFFFFFFFF) - SCORE_OFFSET
+        return None
+
+    def put(self, bitboard_player, bitboard_opponent, score):
+        self.stores += 1
+        h = position_hash(bitboard_player, bitboard_opponent)
+        verification = (h >> 32) | 1
+        index = h & self.index_mask
+        entries = self.entries
+        entry = verification << 32 | (score + SCORE_OFFSET)
+        for probe in range(PROBE_LENGTH):
+            slot = (index + probe) & self.index_mask
+            current = entries[slot]
+            if current == 0 or current >> 32 == verification:
+                entries[slot] = entry
+                return
+        # Probe window full: replace its first slot
+        self.evictions += 1
+        entries[index] = entry
+
+    def stats(self):
+        return {
+            "size_mb": 8 * self.size / (1 << 20),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,63 @@
+from bit_board_masks import ROW_MASKS
+from bit_board_logic import decode_move
+from config import eval_chunk_bits
+
+# Board evaluation as per cell weights, same score as the row by row evaluation:
+#   AI (player2) pieces: 50 on the goal rows 0-2, 16 - row elsewhere
+#   human (player1) pieces: 50 on the goal rows 14-16, row elsewhere
+#   score = AI weights - human weights
+# Since a move only changes two cells, the search updates the score with the move deltas
+# (score += w[to] - w[from]) and a leaf costs nothing. evaluate_full scores a whole board
+# through lookup tables of 8 or 16 bit chunks, for positions coming from outside the search.
+
+# Change this whenever the weights change: stored analysis (analysis_store.py) of another version is dropped
+EVAL_VERSION = 1
+
+CELLS = 81
+PLAYER_GOAL_ROWS = {0, 1, 2}
+OPPONENT_GOAL_ROWS = {14, 15, 16}
+
+player_cell_weights = [0] * CELLS
+opponent_cell_weights = [0] * CELLS
+for row, row_mask in enumerate(ROW_MASKS):
+    for cell in range(CELLS):
+        if (row_mask >> cell) & 1:
+            player_cell_weights[cell] = 50 if row in PLAYER_GOAL_ROWS else 16 - row
+            opponent_cell_weights[cell] = 50 if row in OPPONENT_GOAL_ROWS else row
+
+# Score change of every packed move of each side
+player_move_delta = [0] * (CELLS << 7)
+opponent_move_delta = [0] * (CELLS << 7)
+for move in range(CELLS << 7):
+    from_index, to_index = decode_move(move)
+    if from_index < CELLS and to_index < CELLS:
+        player_move_delta[move] = player_cell_weights[to_index] - player_cell_weights[from_index]
+        opponent_move_delta[move] = opponent_cell_weights[from_index] - opponent_cell_weights[to_index]
+
+def chunk_tables(weights, chunk_bits):
+    """
+    tables[c][value] = sum of the weights of the bits set in 'value', for the bits c * chunk_bits onward.
+    """
+    tables = []
+    for start in range(0, CELLS, chunk_bits):
+        chunk_weights = weights[start:start + chunk_bits]
+        table = [0] * (1 << len(chunk_weights))
+        for value in range(1, len(table)):
+            lowest = value & -value
+            table[value] = table[value ^ lowest] + chunk_weights[lowest.bit_length() - 1]
+        tables.append(table)
+    return tables
+
+CHUNK_MASK = (1 << eval_chunk_bits) - 1
+player_chunk_tables = chunk_tables(player_cell_weights, eval_chunk_bits)
+opponent_chunk_tables = chunk_tables(opponent_cell_weights, eval_chunk_bits)
+
+def weight_sum(bitboard, tables):
+    total = 0
+    for table in tables:
+        total += table[bitboard & CHUNK_MASK]
+        bitboard >>= eval_chunk_bits
+    return total
+
+def evaluate_full(bitboard_player, bitboard_opponent):
+    return weight_sum(bitboard_player, player_chunk_tables) - weight_sum(bitboard_opponent, opponent_chunk_tables)
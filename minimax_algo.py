@@ -1,11 +1,31 @@
 import math
-import os
-from bit_board_logic import iterate_bits, moves, play_move, extract_bits, bit_to_index
-from functools import lru_cache
-from collections import defaultdict
-from bit_board_masks import ROW_MASKS
-
-search_stats = defaultdict(int)
+import time
+from bit_board_logic import extract_bits, bit_to_index, side_moves, play_packed_move
+from transposition_table import (TranspositionTable, zobrist_hash, PLAYER_MOVE_KEYS, OPPONENT_MOVE_KEYS,
+                                 SIDE_TO_MOVE_KEY, EXACT, LOWER_BOUND, UPPER_BOUND)
+from move_ordering import MoveOrdering
+from eval_cache import EvalCache
+from evaluation import evaluate_full, player_move_delta, opponent_move_delta
+from search_statistics import SearchStats, CUTOFF_SLOTS
+from race_solver import race_move
+from opening_book import get_opening_book
+from analysis_store import get_analysis_store
+from config import (use_transposition_table, transposition_table_size, use_move_ordering, eval_cache_mb,
+                    use_race_solver, race_node_budget, use_opening_book,
+                    analysis_store_path, analysis_store_mb)
+
+# Iterative deepening (see best_move): minimax raises SearchTimeout once time.perf_counter() passes
+# search_deadline, the clock is only read at nodes DEADLINE_CHECK_DEPTH or more plies above the leaves
+search_deadline = None
+DEADLINE_CHECK_DEPTH = 2
+
+class SearchTimeout(Exception):
+    pass
+
+# Kept between AI moves: positions searched for the last move often come back in the next search
+transposition_table = TranspositionTable(transposition_table_size) if use_transposition_table else None
+move_ordering = MoveOrdering() if use_move_ordering else None
+eval_cache = EvalCache(eval_cache_mb) if eval_cache_mb else None
 
 pos2ix = {(0, 0): 0, (-1, 1): 1, (1, 1): 2, (-2, 2): 3, (0, 2): 4, (2, 2): 5, (-3, 3): 6,
 (-1, 3): 7, (1, 3): 8, (3, 3): 9, (-4, 4): 10, (-2, 4): 11, (0, 4): 12, (2, 4): 13, (4, 4): 14,
@@ -82,117 +102,305 @@ ix2pos = {val:key for key,val in pos2ix.items()}
 
 #     return total_score + mean_row_opponent - mean_row_player # Higher score is better
 
-@lru_cache(maxsize=100000)
 def evaluate_board_bit_board(bitboard_player, bitboard_opponent):
-
-    def bit_count(x): return bin(x).count("1")
-
-    GOAL_ROW_TOP = {0, 1, 2}
-    GOAL_ROW_BOTTOM = {14, 15, 16}
-
-    player_score = 0
-    opponent_score = 0
-
-    for row in range(17):
-        mask = ROW_MASKS[row]
-        player_bits = bitboard_player & mask
-        opponent_bits = bitboard_opponent & mask
-
-        player_count = bit_count(player_bits)
-        opponent_count = bit_count(opponent_bits)
-
-        if row in GOAL_ROW_TOP:
-            player_score += player_count * 50
-        else:
-            player_score += player_count * (16 - row)
-
-        if row in GOAL_ROW_BOTTOM:
-            opponent_score += opponent_count * 50
-        else:
-            opponent_score += opponent_count * row
-
-    return player_score - opponent_score
+    """
+    AI pieces score 50 on their goal rows (0-2) and 16 - row elsewhere, human pieces 50 on rows 14-16
+    and row elsewhere, the result is AI - human. Computed with the per cell weights of evaluation.py,
+    inside the search the score is updated move by move instead.
+    """
+    if eval_cache is None:
+        return evaluate_full(bitboard_player, bitboard_opponent)
+    score = eval_cache.get(bitboard_player, bitboard_opponent)
+    if score is None:
+        score = evaluate_full(bitboard_player, bitboard_opponent)
+        eval_cache.put(bitboard_player, bitboard_opponent, score)
+    return score
+
+def clear_search_caches():
+    """
+    Start of a new game: forget the cached scores and searched positions.
+    """
+    if eval_cache is not None:
+        eval_cache.clear()
+    if transposition_table is not None:
+        transposition_table.clear()
 
 def get_indexes(bitboard):
     return [bit_to_index(b) for b in extract_bits(bitboard)]
 
-def minimax(bitboard_player, bitboard_opponent, bitboard_occupied, depth, alpha, beta, is_maximizing):
+def minimax(bitboard_player, bitboard_opponent, bitboard_occupied, depth, alpha, beta, is_maximizing,
+            tt=None, key=None, ordering=None, score=None, stats=None):
     """
     Minimax algorithm with Alpha-Beta Pruning.
+    With a transposition table 'tt' (see transposition_table.py), 'key' is the Zobrist key of the
+    position, it is updated move by move and the search reuses what is stored for the position.
+    'ordering' is a move_ordering.MoveOrdering, without it the moves are searched in generation order.
+    'score' is the evaluation of the position, updated move by move (computed here when None).
+    'stats' is a search_statistics.SearchStats to count into, None to skip the counting.
     """
 
-    search_stats['states'] += 1
+    if stats is not None:
+        stats.nodes += 1
+        stats.nodes_per_depth[depth] = stats.nodes_per_depth.get(depth, 0) + 1
+    if search_deadline is not None and depth >= DEADLINE_CHECK_DEPTH and time.perf_counter() > search_deadline:
+        raise SearchTimeout
 
+    if score is None:
+        score = evaluate_board_bit_board(bitboard_player, bitboard_opponent)
     if depth == 0:
-        search_stats['leaf_paths'] += 1
-        return evaluate_board_bit_board(bitboard_player, bitboard_opponent)
-    
-    all_pieces = extract_bits(bitboard_player) if is_maximizing else extract_bits(bitboard_opponent)
-    
+        if stats is not None:
+            stats.leaves += 1
+        return score
+
+    tt_move = None
+    if tt is not None:
+        if key is None:
+            key = zobrist_hash(bitboard_player, bitboard_opponent, is_maximizing)
+        entry = tt.probe(key)
+        if entry is not None:
+            _, entry_depth, flag, entry_score, tt_move = entry
+            if stats is not None:
+                stats.tt_hits += 1
+            if entry_depth >= depth and (flag == EXACT
+                                         or (flag == LOWER_BOUND and entry_score >= beta)
+                                         or (flag == UPPER_BOUND and entry_score <= alpha)):
+                if stats is not None:
+                    stats.tt_cutoffs += 1
+                return entry_score
+        original_alpha, original_beta = alpha, beta
+
+    best_move_found = None
     if is_maximizing:
         best_score = -math.inf
         move_count = 0
-        for piece in all_pieces:
-            # possible_moves = moves(piece, bitboard_occupied)
-            # move_bits = extract_bits(possible_moves)
-            for move in iterate_bits(moves(piece, bitboard_occupied)):
-                move_count += 1
-                new_occupied, new_player = play_move(piece, move, bitboard_occupied, bitboard_player)
-                score = minimax(new_player, bitboard_opponent, new_occupied, depth - 1, alpha, beta, False)
-                best_score = max(best_score, score)
-                alpha = max(alpha, score)
-                if beta <= alpha:
-                    break  # Prune the branch
-        search_stats['moves'] += move_count
-        return best_score
+        # All the moves of the side in one go (a single call with the compiled code)
+        for move in order_moves(side_moves(bitboard_player, bitboard_occupied), tt_move, depth, True, ordering):
+            move_count += 1
+            new_occupied, new_player = play_packed_move(move, bitboard_occupied, bitboard_player)
+            child_key = None if tt is None else key ^ PLAYER_MOVE_KEYS[move] ^ SIDE_TO_MOVE_KEY
+            child_score = minimax(new_player, bitboard_opponent, new_occupied, depth - 1, alpha, beta, False, tt,
+                                  child_key, ordering, score + player_move_delta[move], stats)
+            if child_score > best_score:
+                best_score = child_score
+                best_move_found = move
+            alpha = max(alpha, child_score)
+            if beta <= alpha:
+                if ordering is not None:
+                    ordering.record_cutoff(move, depth, True, move_count)
+                if stats is not None:
+                    stats.cutoffs_by_move[min(move_count, CUTOFF_SLOTS) - 1] += 1
+                break  # Prune the branch
     else:
         best_score = math.inf
         move_count = 0
-        for piece in all_pieces:
-            # possible_moves = moves(piece, bitboard_occupied)
-            # move_bits = extract_bits(possible_moves)
-            for move in iterate_bits(moves(piece, bitboard_occupied)):
-                move_count += 1
-                new_occupied, new_opponent = play_move(piece, move, bitboard_occupied, bitboard_opponent)
-                score = minimax(bitboard_player, new_opponent, new_occupied, depth - 1, alpha, beta, True)
-                best_score = min(best_score, score)
-                beta = min(beta, score)
-                if beta <= alpha:
-                    break  # Prune the branch
-        search_stats['moves'] += move_count
-        return best_score
-
-def best_move(bitboard_player, bitboard_opponent, bitboard_occupied, depth=4, verbose=False):
+        # All the moves of the side in one go (a single call with the compiled code)
+        for move in order_moves(side_moves(bitboard_opponent, bitboard_occupied), tt_move, depth, False, ordering):
+            move_count += 1
+            new_occupied, new_opponent = play_packed_move(move, bitboard_occupied, bitboard_opponent)
+            child_key = None if tt is None else key ^ OPPONENT_MOVE_KEYS[move] ^ SIDE_TO_MOVE_KEY
+            child_score = minimax(bitboard_player, new_opponent, new_occupied, depth - 1, alpha, beta, True, tt,
+                                  child_key, ordering, score + opponent_move_delta[move], stats)
+            if child_score < best_score:
+                best_score = child_score
+                best_move_found = move
+            beta = min(beta, child_score)
+            if beta <= alpha:
+                if ordering is not None:
+                    ordering.record_cutoff(move, depth, False, move_count)
+                if stats is not None:
+                    stats.cutoffs_by_move[min(move_count, CUTOFF_SLOTS) - 1] += 1
+                break  # Prune the branch
+    if stats is not None:
+        stats.moves += move_count
+
+    if tt is not None:
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= original_beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        tt.store(key, depth, flag, best_score, best_move_found)
+    return best_score
+
+def order_moves(move_list, tt_move, depth, is_maximizing, ordering):
+    if ordering is None:
+        return stored_move_first(move_list, tt_move)
+    return ordering.order(move_list, tt_move, depth, is_maximizing)
+
+def stored_move_first(move_list, tt_move):
     """
-    Find the best move for the AI using Minimax with Alpha-Beta Pruning.
+    Search the best move stored in the transposition table first, it is the most likely to prune the others.
+    """
+    if tt_move is None:
+        return move_list
+    try:
+        position = move_list.index(tt_move)
+    except ValueError:
+        return move_list  # Key collision, the stored move isn't legal here
+    move_list = move_list[:]
+    move_list[0], move_list[position] = move_list[position], move_list[0]
+    return move_list
+
+def search_root(bitboard_player, bitboard_opponent, bitboard_occupied, depth, tt=None, first_move=None,
+                ordering=None, stats=None):
+    """
+    One fixed depth search of the AI moves, 'first_move' is searched before the others.
+    Returns (best packed move, its score), (None, -inf) if there is no move.
     """
+    key = None if tt is None else zobrist_hash(bitboard_player, bitboard_opponent, True)
+    root_score = evaluate_board_bit_board(bitboard_player, bitboard_opponent)
     best_score = -math.inf
     best_move_choice = None
     alpha, beta = -math.inf, math.inf
-    
-    for piece in iterate_bits(bitboard_player):
-        # possible_moves = moves(piece, bitboard_occupied)
-        # move_bits = extract_bits(possible_moves)
-
-        # # Sort moves: prioritize forward moves first
-        # move_bits.sort(key=lambda move: ix2pos[bit_to_index(move)][1] - ix2pos[bit_to_index(piece)][1], reverse=True)
-
-        for move in iterate_bits(moves(piece, bitboard_occupied)):
-            new_occupied, new_player = play_move(piece, move, bitboard_occupied, bitboard_player)
-            score = minimax(new_player, bitboard_opponent, new_occupied, depth - 1, alpha, beta, False)
-            if score > best_score:
-                best_score = score
-                best_move_choice = (piece, move)
-            alpha = max(alpha, score)
-            if beta <= alpha:
-                break  # Prune the branch
-    
+    if stats is not None:
+        stats.nodes += 1
+        stats.nodes_per_depth[depth] = stats.nodes_per_depth.get(depth, 0) + 1
+    move_count = 0
+
+    # Forward moves first (see move_ordering.py)
+    for move in order_moves(side_moves(bitboard_player, bitboard_occupied), first_move, depth, True, ordering):
+        move_count += 1
+        new_occupied, new_player = play_packed_move(move, bitboard_occupied, bitboard_player)
+        child_key = None if tt is None else key ^ PLAYER_MOVE_KEYS[move] ^ SIDE_TO_MOVE_KEY
+        score = minimax(new_player, bitboard_opponent, new_occupied, depth - 1, alpha, beta, False, tt, child_key,
+                        ordering, root_score + player_move_delta[move], stats)
+        if score > best_score:
+            best_score = score
+            best_move_choice = move
+        alpha = max(alpha, score)
+        if beta <= alpha:
+            break  # Prune the branch
+    if stats is not None:
+        stats.moves += move_count
+    return best_move_choice, best_score
+
+def instant_move(bitboard_player, bitboard_opponent, verbose=False, depth=None):
+    """
+    Moves known without searching: the opening book, the analysis store (a result of at least
+    'depth' stored by an earlier search), then the race solver once the armies have passed each other.
+    Returns (packed move, search depth, race distance) or None: the depth of the book or stored
+    search (0 for a race move, nothing was searched) and the AI moves left of a race move (else None).
+    """
+    if use_opening_book:
+        book = get_opening_book()
+        entry = book.lookup(bitboard_player, bitboard_opponent) if book is not None else None
+        if entry is not None:
+            if verbose:
+                print(f"\nOpening book move, searched at depth {entry[2]}")
+            return entry[0], entry[2], None
+    store = get_analysis_store(analysis_store_path, analysis_store_mb) if analysis_store_path else None
+    if store is not None and depth is not None:
+        entry = store.probe(zobrist_hash(bitboard_player, bitboard_opponent, True))
+        if (entry is not None and entry[0] is not None and entry[1] >= depth
+                and entry[0] in side_moves(bitboard_player, bitboard_player | bitboard_opponent)):
+            if verbose:
+                print(f"\nStored analysis, searched at depth {entry[1]}")
+            return entry[0], entry[1], None
+    if use_race_solver:
+        race = race_move(bitboard_player, bitboard_opponent, race_node_budget)
+        if race is not None:
+            if verbose:
+                print(f"\nRace endgame, {race[1]} AI moves left")
+            return race[0], 0, race[1]
+    return None
+
+def record_search(bitboard_player, bitboard_opponent, move, score, depth):
+    """
+    Keep a root search result in the analysis store (if there is one) for later games and processes.
+    """
+    if not analysis_store_path or move is None or depth < 1:
+        return
+    store = get_analysis_store(analysis_store_path, analysis_store_mb)
+    if store is not None:
+        store.store(zobrist_hash(bitboard_player, bitboard_opponent, True), move, depth, EXACT, score)
+
+def timed_search_root(bitboard_player, bitboard_opponent, bitboard_occupied, depth, tt, first_move, ordering, stats):
+    start = time.perf_counter()
+    result = search_root(bitboard_player, bitboard_opponent, bitboard_occupied, depth, tt, first_move, ordering, stats)
+    if stats is not None:
+        stats.iteration_times.append([depth, time.perf_counter() - start])
+        stats.depth_reached = depth
+    return result
+
+def iterative_deepening(bitboard_player, bitboard_opponent, bitboard_occupied, max_depth, time_limit_ms, tt=None,
+                        ordering=None, stats=None):
+    """
+    Search depth 1, 2, 3, ... until 'max_depth' or until 'time_limit_ms' runs out, every iteration
+    starts with the best move of the previous one. An interrupted iteration is thrown away.
+    Depth 1 always completes so there is a move even with a tiny budget.
+    Returns (best packed move, depth reached, its score).
+    """
+    global search_deadline
+    start = time.perf_counter()
+    best_move_choice, depth_reached, best_score = None, 0, -math.inf
+    try:
+        for depth in range(1, max_depth + 1):
+            if depth > 1:
+                search_deadline = start + time_limit_ms / 1000
+            move, score = timed_search_root(bitboard_player, bitboard_opponent, bitboard_occupied, depth, tt,
+                                            best_move_choice, ordering, stats)
+            best_move_choice, depth_reached, best_score = move, depth, score
+            if move is None or time.perf_counter() >= start + time_limit_ms / 1000:
+                break
+    except SearchTimeout:
+        pass
+    finally:
+        search_deadline = None
+    return best_move_choice, depth_reached, best_score
+
+def best_move(bitboard_player, bitboard_opponent, bitboard_occupied, depth=4, verbose=False, tt=None,
+              time_limit_ms=None, ordering=None, stats=None):
+    """
+    Find the best move for the AI using Minimax with Alpha-Beta Pruning.
+    Returns the packed move (see bit_board_logic.encode_move), None if there is no move.
+    'tt' and 'ordering' default to the module transposition table and move ordering
+    (None if turned off in config.py).
+    With 'time_limit_ms' the search deepens iteratively up to 'depth' within the budget
+    and returns (packed move, depth reached) instead.
+    Pass a search_statistics.SearchStats as 'stats' to get the search counters back.
+    """
+    if tt is None:
+        tt = transposition_table
+    if ordering is None:
+        ordering = move_ordering
+    if ordering is not None:
+        ordering.new_search()
+    if stats is None and verbose:
+        stats = SearchStats()
+
+    known = instant_move(bitboard_player, bitboard_opponent, verbose, depth)
+    if known is not None:
+        if stats is not None:
+            stats.depth_reached = known[1]
+            stats.race_distance = known[2]
+        return known[0] if time_limit_ms is None else known[:2]
+
+    start = time.perf_counter()
+    if time_limit_ms is None:
+        best_move_choice, best_score = timed_search_root(bitboard_player, bitboard_opponent, bitboard_occupied, depth,
+                                                         tt, None, ordering, stats)
+        depth_reached = depth
+    else:
+        best_move_choice, depth_reached, best_score = iterative_deepening(
+            bitboard_player, bitboard_opponent, bitboard_occupied, depth, time_limit_ms, tt, ordering, stats)
+    record_search(bitboard_player, bitboard_opponent, best_move_choice, best_score, depth_reached)
+    if stats is not None:
+        stats.elapsed += time.perf_counter() - start
+
     if verbose:
-        print()
-        print("Search stats:")
-        print("States visited:", search_stats['states'])
-        print("Leaf paths reached:", search_stats['leaf_paths'])
-        print("Total moves considered:", search_stats['moves'])
-        print("Avg branching factor:", round(search_stats['moves'] / (search_stats['states']-search_stats['leaf_paths']), 2))
-
-    return best_move_choice
\ No newline at end of file
+        print_search_summary("Search stats", stats, tt, ordering)
+
+    if time_limit_ms is None:
+        return best_move_choice
+    return best_move_choice, depth_reached
+
+def print_search_summary(title, stats, tt=None, ordering=None):
+    print()
+    print(f"{title}:", stats.to_json())
+    if tt is not None:
+        print("Transposition table:", tt.stats())
+    if ordering is not None:
+        print("Move ordering:", ordering.stats())
+    if eval_cache is not None:
+        print("Evaluation cache:", eval_cache.stats())
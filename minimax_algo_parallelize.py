@@ -1,98 +1,446 @@
-from concurrent.futures import ProcessPoolExecutor
+from array import array
 import math
-import multiprocessing
+import threading
+import time
 
-from bit_board_logic import extract_bits, iterate_bits, moves, play_move
-from minimax_algo import minimax, search_stats
+import minimax_algo
+import engine_pool
+
+from bit_board_logic import side_moves, play_packed_move
+from minimax_algo import SearchTimeout, instant_move, record_search, order_moves
+from move_ordering import ai_row_gain, human_row_gain
+from transposition_table import zobrist_hash
+from search_statistics import SearchStats
+from engine_pool import get_engine_pool, raise_shared_alpha
+from shared_transposition_table import attach_shared_table
+from config import engine, transposition_table_size, hybrid_min_moves, hybrid_max_moves, hybrid_margin
+
+if engine == "numba":
+    from minimax_numba import minimax
+    search_options = {}
+else:
+    from minimax_algo import minimax, transposition_table, move_ordering
+    # Each process has its own table and move ordering, shared by all the moves it searches
+    search_options = {"tt": transposition_table, "ordering": move_ordering}
+
+# Time budgets of the worker tasks. With a thread pool the tasks share minimax_algo.search_deadline:
+# it is the earliest deadline of the running timed tasks and goes back to None after the last one
+deadline_lock = threading.Lock()
+timed_tasks = 0
+
+def start_deadline(time_budget):
+    global timed_tasks
+    with deadline_lock:
+        timed_tasks += 1
+        deadline = time.perf_counter() + time_budget
+        if minimax_algo.search_deadline is None or deadline < minimax_algo.search_deadline:
+            minimax_algo.search_deadline = deadline
+    return deadline
+
+def end_deadline():
+    global timed_tasks
+    with deadline_lock:
+        timed_tasks -= 1
+        if timed_tasks == 0:
+            minimax_algo.search_deadline = None
 
 def minimax_wrapper(args):
-    piece, move, bitboard_player, bitboard_opponent, bitboard_occupied, depth = args
+    """
+    Scores a batch of root moves (an array('H') of packed moves) in a worker.
+    The position is sent once per batch, the occupied board is rebuilt from the two sides.
+    Returns (scores, SearchStats of the batch).
+    """
+    bitboard_player, bitboard_opponent, depth, move_list = args[:4]
+    # Optional time budget in seconds, the scores are None if it runs out
+    time_budget = args[4] if len(args) > 4 else None
+
+    stats = SearchStats()
+    bitboard_occupied = bitboard_player | bitboard_opponent
+    scores = []
+    if time_budget is not None:
+        deadline = start_deadline(time_budget)
+    try:
+        for move in move_list:
+            if time_budget is not None and time.perf_counter() > deadline:
+                raise SearchTimeout
+            new_occupied, new_player = play_packed_move(move, bitboard_occupied, bitboard_player)
+            scores.append(minimax(new_player, bitboard_opponent, new_occupied, depth - 1, -math.inf, math.inf, False,
+                                  stats=stats, **search_options))
+    except SearchTimeout:
+        scores = None
+    finally:
+        if time_budget is not None:
+            end_deadline()
+
+    return scores, stats
 
-    search_stats.clear()
+def ordered_moves(move_list, depth, is_maximizing, tt_move=None):
+    """
+    Most promising moves first: with the move ordering of the engine, else the forward moves first.
+    """
+    ordering = search_options.get("ordering")
+    if ordering is not None:
+        return order_moves(move_list, tt_move, depth, is_maximizing, ordering)
+    return sorted(move_list, key=(ai_row_gain if is_maximizing else human_row_gain).__getitem__, reverse=True)
 
-    new_occupied, new_player = play_move(piece, move, bitboard_occupied, bitboard_player)
-    score = minimax(new_player, bitboard_opponent, new_occupied, depth - 1, -math.inf, math.inf, False)
+def refutable_search(bitboard_player, bitboard_opponent, bitboard_occupied, depth, stats):
+    """
+    Score of a position just after a root move (the human to move), searched reply by reply with the
+    latest shared alpha: another worker finding a better root move tightens the window of the
+    remaining replies, and the move is dropped as soon as a reply brings it under the alpha.
+    Returns the exact score when it is above every alpha used, None otherwise (the move is refuted:
+    all that is known is an upper bound, not above a move already found).
+    """
+    replies = side_moves(bitboard_opponent, bitboard_occupied)
+    if depth == 0 or not replies:
+        return minimax(bitboard_player, bitboard_opponent, bitboard_occupied, depth, -math.inf, math.inf, False,
+                       stats=stats, **search_options)
+    stats.nodes += 1
+    beta = math.inf
+    highest_alpha = -math.inf
+    for reply in ordered_moves(replies, depth, False):
+        alpha = engine_pool.shared_alpha.value
+        highest_alpha = max(highest_alpha, alpha)
+        if beta <= alpha:
+            stats.refuted += 1
+            return None
+        new_occupied, new_opponent = play_packed_move(reply, bitboard_occupied, bitboard_opponent)
+        beta = min(beta, minimax(bitboard_player, new_opponent, new_occupied, depth - 1, alpha, beta, True,
+                                 stats=stats, **search_options))
+    if beta <= highest_alpha:
+        # A reply failed low against an alpha, its score (and so beta) is only an upper bound
+        stats.refuted += 1
+        return None
+    raise_shared_alpha(beta)
+    return beta
 
-    stats_snapshot = dict(search_stats)
-    return score, (piece, move), stats_snapshot
+def ybwc_wrapper(args):
+    """
+    Scores a batch of root moves against the shared alpha of the pool (see refutable_search).
+    Returns (scores, SearchStats of the batch), the score of a refuted move is None.
+    """
+    bitboard_player, bitboard_opponent, depth, move_list = args[:4]
+    # Optional time budget in seconds, the scores are None if it runs out
+    time_budget = args[4] if len(args) > 4 else None
 
-def best_move_parallelized(bitboard_player, bitboard_opponent, bitboard_occupied, depth=4, verbose=False):
+    stats = SearchStats()
+    bitboard_occupied = bitboard_player | bitboard_opponent
+    scores = []
+    if time_budget is not None:
+        start_deadline(time_budget)
+    try:
+        for move in move_list:
+            new_occupied, new_player = play_packed_move(move, bitboard_occupied, bitboard_player)
+            scores.append(refutable_search(new_player, bitboard_opponent, new_occupied, depth - 1, stats))
+    except SearchTimeout:
+        scores = None
+    finally:
+        if time_budget is not None:
+            end_deadline()
+    return scores, stats
+
+def split_moves(move_list, batch_count):
+    """
+    Cut a move list into at most 'batch_count' consecutive array('H') batches.
+    """
+    batch_size = max(1, -(-len(move_list) // batch_count))
+    return [move_list[i:i + batch_size] for i in range(0, len(move_list), batch_size)]
+
+def best_move_parallelized(bitboard_player, bitboard_opponent, bitboard_occupied, depth=4, verbose=False, stats=None):
+    """
+    Young Brothers Wait: the most promising root move is searched here first, with the full window,
+    and its score becomes the shared alpha of the pool. The other root moves are then searched by the
+    workers, which raise the shared alpha whenever they find a better move and drop a move as soon as
+    it is refuted (see refutable_search), so the workers prune with each other's results.
+    The counters of all the searches are added to 'stats' (a search_statistics.SearchStats) when one is passed.
+    """
+    start = time.perf_counter()
     best_score = -math.inf
     best_move_choice = None
+    if stats is None:
+        stats = SearchStats()
 
-    total_states = 0
-    total_leaves = 0
-    total_moves = 0
+    known = instant_move(bitboard_player, bitboard_opponent, verbose, depth)
+    if known is not None:
+        stats.depth_reached = known[1]
+        stats.race_distance = known[2]
+        return known[0]
 
-    all_moves = []
-    for piece in iterate_bits(bitboard_player):
-        possible_moves = extract_bits(moves(piece, bitboard_occupied))
-        for move in possible_moves:
-            all_moves.append((piece, move, bitboard_player, bitboard_opponent, bitboard_occupied, depth))
+    tt_move = None
+    tt = search_options.get("tt")
+    if tt is not None:
+        entry = tt.probe(zobrist_hash(bitboard_player, bitboard_opponent, True))
+        tt_move = entry[4] if entry is not None else None
+    move_list = array("H", ordered_moves(side_moves(bitboard_player, bitboard_occupied), depth, True, tt_move))
 
-    with ProcessPoolExecutor(max_workers=multiprocessing.cpu_count()) as executor:
-        results = executor.map(minimax_wrapper, all_moves)
+    if move_list:
+        best_move_choice = move_list[0]
+        new_occupied, new_player = play_packed_move(best_move_choice, bitboard_occupied, bitboard_player)
+        best_score = minimax(new_player, bitboard_opponent, new_occupied, depth - 1, -math.inf, math.inf, False,
+                             stats=stats, **search_options)
 
-        for score, move_choice, stats in results:
-            if score > best_score:
+    pool = get_engine_pool()
+    pool.set_alpha(best_score)
+    # A few batches per worker so a slow batch doesn't leave the others idle
+    batches = split_moves(move_list[1:], 4 * pool.workers)
+    all_args = [(bitboard_player, bitboard_opponent, depth, batch) for batch in batches]
+    results = pool.map(ybwc_wrapper, all_args)
+
+    for batch, (scores, batch_stats) in zip(batches, results):
+        for move, score in zip(batch, scores):
+            # Only exact scores compete, a refuted move is no better than one already found
+            if score is not None and score > best_score:
                 best_score = score
-                best_move_choice = move_choice
-            total_states += stats.get("states", 0)
-            total_leaves += stats.get("leaf_paths", 0)
-            total_moves += stats.get("moves", 0)
-    
+                best_move_choice = move
+        stats.merge(batch_stats)
+
+    stats.elapsed += time.perf_counter() - start
+    stats.iteration_times.append([depth, time.perf_counter() - start])
+    stats.depth_reached = depth
+    record_search(bitboard_player, bitboard_opponent, best_move_choice, best_score, depth)
     if verbose:
         print()
-        print("Parallel search stats:")
-        print("Total states:", total_states)
-        print("Total leaf paths:", total_leaves)
-        print("Total moves considered:", total_moves)
-        print("Avg branching factor:", round(total_moves / (total_states-total_leaves), 2))
+        print("Parallel search stats:", stats.to_json())
 
     return best_move_choice
 
-def best_move_hybrid(bitboard_player, bitboard_opponent, bitboard_occupied, depth=4, verbose=False):
+def best_move_hybrid(bitboard_player, bitboard_opponent, bitboard_occupied, depth=4, verbose=False,
+                     time_limit_ms=None, stats=None):
+    """
+    Depth 2 search of every move (in parallel), then a deeper parallel search of the best ones
+    (see get_top_moves for the cut). The moves left out are all searched as deep afterwards, against
+    the deep score of the chosen move, so the cut only orders the search (see verify_pruned_moves).
+    With 'time_limit_ms' the top moves are searched at depth 3, 4, ... up to 'depth' until the
+    budget runs out (best move of the previous depth first) and (packed move, depth reached) is returned.
+    The counters of all the searches are added to 'stats' when one is passed.
+    """
+    start = time.perf_counter()
     best_score = -math.inf
     best_move_choice = None
+    if stats is None:
+        stats = SearchStats()
+
+    known = instant_move(bitboard_player, bitboard_opponent, verbose, depth)
+    if known is not None:
+        stats.depth_reached = known[1]
+        stats.race_distance = known[2]
+        return known[0] if time_limit_ms is None else known[:2]
+
+    move_scores = parallel_prefilter(bitboard_player, bitboard_opponent, depth=2, stats=stats)
+    top_moves = [move for _, move in get_top_moves(move_scores)]
+    stats.iteration_times.append([2, time.perf_counter() - start])
+    stats.depth_reached = 2
 
-    move_scores = quick_serial_search(bitboard_player, bitboard_opponent, bitboard_occupied, depth=2)
-    top_moves = get_top_moves(move_scores, 5)
+    pool = get_engine_pool()
 
-    all_args = [(piece, move, bitboard_player, bitboard_opponent, bitboard_occupied, depth) for _, (piece, move) in top_moves]
+    if time_limit_ms is None:
+        depths = [depth]
+    else:
+        depths = range(3, depth + 1)
+        best_move_choice = top_moves[0] if top_moves else None
+        depth_reached = 2
 
-    total_states = 0
-    total_leaves = 0
-    total_moves = 0
+    for iteration_depth in depths:
+        if not top_moves:
+            break
+        if time_limit_ms is None:
+            time_budget = None
+        else:
+            time_budget = time_limit_ms / 1000 - (time.perf_counter() - start)
+            if time_budget <= 0:
+                break
+        batches = split_moves(array("H", top_moves), pool.workers)
+        all_args = [(bitboard_player, bitboard_opponent, iteration_depth, batch, time_budget) for batch in batches]
+        iteration_start = time.perf_counter()
+        results = pool.map(minimax_wrapper, all_args)
 
-    with ProcessPoolExecutor(max_workers=multiprocessing.cpu_count()) as executor:
-        results = executor.map(minimax_wrapper, all_args)
+        for _, batch_stats in results:
+            stats.merge(batch_stats)
+        if any(scores is None for scores, _ in results):
+            break  # Out of time, keep the last complete depth
 
-        for score, move_choice, stats in results:
+        iteration_scores = [(score, move) for batch, (scores, _) in zip(batches, results)
+                            for move, score in zip(batch, scores)]
+        best_score = -math.inf
+        for score, move in iteration_scores:
             if score > best_score:
                 best_score = score
-                best_move_choice = move_choice
-            total_states += stats.get("states", 0)
-            total_leaves += stats.get("leaf_paths", 0)
-            total_moves += stats.get("moves", 0)
+                best_move_choice = move
+        stats.iteration_times.append([iteration_depth, time.perf_counter() - iteration_start])
+        stats.depth_reached = iteration_depth
+        if time_limit_ms is not None:
+            depth_reached = iteration_depth
+            # The best move goes first in the next iteration
+            top_moves.remove(best_move_choice)
+            top_moves.insert(0, best_move_choice)
 
+    verified = 0
+    if stats.depth_reached > 2:
+        if time_limit_ms is None:
+            time_budget = None
+        else:
+            time_budget = time_limit_ms / 1000 - (time.perf_counter() - start)
+        pruned = [(score, move) for score, move in move_scores if move not in top_moves]
+        verified, verified_score, verified_move = verify_pruned_moves(
+            bitboard_player, bitboard_opponent, stats.depth_reached, pruned, best_score, time_budget, stats)
+        if verified_score > best_score:
+            best_score, best_move_choice = verified_score, verified_move
+
+    stats.elapsed += time.perf_counter() - start
+    if best_score > -math.inf:
+        record_search(bitboard_player, bitboard_opponent, best_move_choice, best_score, stats.depth_reached)
     if verbose:
         print()
-        print("\nHybrid search stats:")
-        print("Total states:", total_states)
-        print("Total leaf paths:", total_leaves)
-        print("Total moves considered:", total_moves)
-        print("Avg branching factor:", round(total_moves / (total_states-total_leaves), 2))
+        print(f"Hybrid search: {len(top_moves)} of {len(move_scores)} moves searched deep, {verified} re-searched")
+        print("Hybrid search stats:", stats.to_json())
 
-    return best_move_choice
+    if time_limit_ms is None:
+        return best_move_choice
+    return best_move_choice, depth_reached
+
+def lazy_smp_wrapper(args):
+    """
+    One Lazy SMP searcher: iterative deepening of the root up to 'depth' with the shared table.
+    Searcher 0 searches like best_move, the others start on another root move and odd ones skip
+    depth 1, so that they don't all walk the same tree at the same time.
+    'new_search': reset the move ordering first (a process searcher, threads share the dispatcher's).
+    Returns (move, score, depth completed, SearchStats), depth 0 if not even one depth finished.
+    """
+    bitboard_player, bitboard_opponent, depth, searcher, time_budget, table_name, new_search = args
+    table = attach_shared_table(table_name, transposition_table_size)
+    ordering = search_options.get("ordering")
+    if ordering is not None and new_search:
+        ordering.new_search()
+    stats = SearchStats()
+    bitboard_occupied = bitboard_player | bitboard_opponent
+    move_list = side_moves(bitboard_player, bitboard_occupied)
+    first_move = move_list[searcher % len(move_list)] if searcher and move_list else None
+    result = (None, -math.inf, 0)
+    if time_budget is not None:
+        start_deadline(time_budget)
+    try:
+        for iteration_depth in range(1 + searcher % 2, depth + 1):
+            move, score = minimax_algo.search_root(bitboard_player, bitboard_opponent, bitboard_occupied,
+                                                   iteration_depth, table, first_move, ordering, stats)
+            result = (move, score, iteration_depth)
+            first_move = move
+    except SearchTimeout:
+        pass
+    finally:
+        if time_budget is not None:
+            end_deadline()
+    return result + (stats,)
+
+def best_move_lazy_smp(bitboard_player, bitboard_opponent, bitboard_occupied, depth=4, verbose=False,
+                       time_limit_ms=None, stats=None):
+    """
+    Lazy SMP: every worker searches the whole root (see lazy_smp_wrapper), all of them reading and
+    writing one transposition table in shared memory, so each one mostly finds the subtrees the
+    others already searched. The move of the deepest completed search wins (searcher 0 on ties).
+    With 'time_limit_ms', (packed move, depth reached) is returned.
+    The numba engine has no transposition table, it gets best_move_parallelized instead, or with
+    'time_limit_ms' the iterative deepening of best_move_hybrid (and the depth it completed).
+    """
+    if engine == "numba":
+        if time_limit_ms is None:
+            return best_move_parallelized(bitboard_player, bitboard_opponent, bitboard_occupied, depth, verbose,
+                                          stats)
+        return best_move_hybrid(bitboard_player, bitboard_opponent, bitboard_occupied, depth, verbose,
+                                time_limit_ms, stats)
+
+    start = time.perf_counter()
+    if stats is None:
+        stats = SearchStats()
+
+    known = instant_move(bitboard_player, bitboard_opponent, verbose, depth)
+    if known is not None:
+        stats.depth_reached = known[1]
+        stats.race_distance = known[2]
+        return known[0] if time_limit_ms is None else known[:2]
+
+    pool = get_engine_pool()
+    table = pool.shared_table(transposition_table_size)
+    time_budget = None if time_limit_ms is None else time_limit_ms / 1000
+    # Threads share one move ordering: it is reset once here, not by every searcher while the others run
+    if pool.threads and search_options.get("ordering") is not None:
+        search_options["ordering"].new_search()
+    all_args = [(bitboard_player, bitboard_opponent, depth, searcher, time_budget, table.name, not pool.threads)
+                for searcher in range(pool.workers)]
+    results = pool.map(lazy_smp_wrapper, all_args)
+
+    best_move_choice, best_score, depth_reached = None, -math.inf, 0
+    for move, score, searcher_depth, searcher_stats in results:
+        stats.merge(searcher_stats)
+        if move is not None and searcher_depth > depth_reached:
+            best_move_choice, best_score, depth_reached = move, score, searcher_depth
+    if best_move_choice is None:
+        # Not even depth 1 in time
+        move_list = side_moves(bitboard_player, bitboard_occupied)
+        best_move_choice = move_list[0] if move_list else None
+
+    stats.elapsed += time.perf_counter() - start
+    stats.iteration_times.append([depth_reached, time.perf_counter() - start])
+    stats.depth_reached = depth_reached
+    record_search(bitboard_player, bitboard_opponent, best_move_choice, best_score, depth_reached)
+    if verbose:
+        print()
+        print("Lazy SMP search stats:", stats.to_json())
+
+    if time_limit_ms is None:
+        return best_move_choice
+    return best_move_choice, depth_reached
+
+def verify_pruned_moves(bitboard_player, bitboard_opponent, depth, pruned, best_score, time_budget=None, stats=None):
+    """
+    Search at 'depth' the pruned (shallow score, move) pairs, best shallow score first: a shallow score
+    says nothing sure about the deep one, any of them may be better than 'best_score', the deep score of
+    the chosen move. They are searched against the shared alpha (see refutable_search), most of them
+    are refuted by their first replies.
+    Returns (moves re-searched, best score, its move), (.., -inf, None) if none of them is better
+    or the time ran out.
+    """
+    suspects = array("H", [move for _, move in sorted(pruned, reverse=True)])
+    if not suspects or (time_budget is not None and time_budget <= 0):
+        return 0, -math.inf, None
+    pool = get_engine_pool()
+    pool.set_alpha(best_score)
+    batches = split_moves(suspects, pool.workers)
+    results = pool.map(ybwc_wrapper, [(bitboard_player, bitboard_opponent, depth, batch, time_budget)
+                                      for batch in batches])
+    verified_score, verified_move = -math.inf, None
+    for batch, (scores, batch_stats) in zip(batches, results):
+        if stats is not None:
+            stats.merge(batch_stats)
+        for move, score in zip(batch, scores or []):
+            if score is not None and score > best_score and score > verified_score:
+                verified_score, verified_move = score, move
+    return len(suspects), verified_score, verified_move
 
-def get_top_moves(move_scores, top_n=5):
-    return sorted(move_scores, reverse=True)[:top_n]
+def get_top_moves(move_scores, min_moves=None, max_moves=None, margin=None):
+    """
+    The (score, move) pairs worth a deep search, best first: at least 'min_moves', then every move
+    within 'margin' of the best score, 'max_moves' at most. Defaults from config.py (hybrid_*).
+    A clear best move keeps the deep search narrow, many close moves widen it.
+    """
+    min_moves = hybrid_min_moves if min_moves is None else min_moves
+    max_moves = hybrid_max_moves if max_moves is None else max_moves
+    margin = hybrid_margin if margin is None else margin
+    ranked = sorted(move_scores, reverse=True)
+    count = min(min_moves, len(ranked))
+    while count < min(max_moves, len(ranked)) and ranked[count][0] >= ranked[0][0] - margin:
+        count += 1
+    return ranked[:count]
 
-def quick_serial_search(bitboard_player, bitboard_opponent, bitboard_occupied, depth=2):
+def parallel_prefilter(bitboard_player, bitboard_opponent, depth=2, stats=None):
+    """
+    (score, move) of every root move searched at 'depth' on the pool.
+    """
+    pool = get_engine_pool()
+    batches = split_moves(side_moves(bitboard_player, bitboard_player | bitboard_opponent), pool.workers)
+    results = pool.map(minimax_wrapper, [(bitboard_player, bitboard_opponent, depth, batch) for batch in batches])
     move_scores = []
-    for piece in iterate_bits(bitboard_player):
-        for move in extract_bits(moves(piece, bitboard_occupied)):
-            new_occupied, new_player = play_move(piece, move, bitboard_occupied, bitboard_player)
-            score = minimax(new_player, bitboard_opponent, new_occupied, depth-1, -math.inf, math.inf, False)
-            move_scores.append((score, (piece, move)))
+    for batch, (scores, batch_stats) in zip(batches, results):
+        if stats is not None:
+            stats.merge(batch_stats)
+        move_scores.extend(zip(scores, batch))
     return move_scores
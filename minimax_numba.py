@@ -0,0 +1,329 @@
+import math
+import time
+import numpy as np
+from numba import njit
+
+from bit_board_masks import neighbors_masks_list, jump_pairs_list
+from bit_board_logic import bit_to_index, encode_move
+from search_statistics import SearchStats
+from minimax_algo import instant_move
+from evaluation import player_cell_weights, opponent_cell_weights
+
+# Numba version of minimax_algo.
+# Every 81 bit board is stored as two uint64 limbs (low = bits 0-63, high = bits 64-80),
+# move generation, play_move, the evaluation and alpha-beta are all compiled with @njit.
+# best_move and minimax take and return the same values as the ones in minimax_algo,
+# so they can be swapped with the "engine" setting in config.py.
+
+CELLS = 81
+MAX_SIDE_MOVES = 10 * CELLS
+INF = 1 << 40  # stands in for math.inf inside the compiled code
+
+LOW_LIMB = (1 << 64) - 1
+
+def split_limbs(bitboard):
+    return np.uint64(bitboard & LOW_LIMB), np.uint64(bitboard >> 64)
+
+# Single bit of every cell, as limbs
+CELL_LOW = np.zeros(CELLS, dtype=np.uint64)
+CELL_HIGH = np.zeros(CELLS, dtype=np.uint64)
+for cell in range(CELLS):
+    CELL_LOW[cell], CELL_HIGH[cell] = split_limbs(1 << cell)
+
+NEIGHBORS_LOW = np.zeros(CELLS, dtype=np.uint64)
+NEIGHBORS_HIGH = np.zeros(CELLS, dtype=np.uint64)
+for cell, mask in enumerate(neighbors_masks_list):
+    NEIGHBORS_LOW[cell], NEIGHBORS_HIGH[cell] = split_limbs(mask)
+
+# (jumped over cell, landing cell) for every jump direction of a cell, from the same masks
+JUMP_COUNT = np.zeros(CELLS, dtype=np.int64)
+JUMP_OVER = np.zeros((CELLS, 6), dtype=np.int64)
+JUMP_LANDING = np.zeros((CELLS, 6), dtype=np.int64)
+for cell, pairs in enumerate(jump_pairs_list):
+    JUMP_COUNT[cell] = len(pairs)
+    for k, (over, landing) in enumerate(pairs):
+        JUMP_OVER[cell, k] = bit_to_index(over)
+        JUMP_LANDING[cell, k] = bit_to_index(landing)
+
+# Per cell weights of evaluation.py (same score as evaluate_board_bit_board)
+PLAYER_WEIGHTS = np.array(player_cell_weights, dtype=np.int64)
+OPPONENT_WEIGHTS = np.array(opponent_cell_weights, dtype=np.int64)
+
+# search statistics counters
+STATES, LEAF_PATHS, MOVES = 0, 1, 2
+
+
+@njit(cache=True)
+def has_cell(low, high, cell):
+    return (low & CELL_LOW[cell]) != 0 or (high & CELL_HIGH[cell]) != 0
+
+@njit(cache=True)
+def generate_moves(side_low, side_high, occupied_low, occupied_high, move_from, move_to, stack):
+    """
+    Same moves as bit_board_logic.side_moves, written into move_from/move_to.
+    Returns the number of moves.
+    """
+    move_count = 0
+    for piece in range(CELLS):
+        if not has_cell(side_low, side_high, piece):
+            continue
+
+        # Single steps
+        targets_low = NEIGHBORS_LOW[piece] & ~occupied_low
+        targets_high = NEIGHBORS_HIGH[piece] & ~occupied_high
+
+        # Jump chain, depth first over the landing squares
+        jumps_low = np.uint64(0)
+        jumps_high = np.uint64(0)
+        stack[0] = piece
+        stack_size = 1
+        while stack_size > 0:
+            stack_size -= 1
+            position = stack[stack_size]
+            for k in range(JUMP_COUNT[position]):
+                over = JUMP_OVER[position, k]
+                landing = JUMP_LANDING[position, k]
+                if (has_cell(occupied_low, occupied_high, over)
+                        and not has_cell(occupied_low, occupied_high, landing)
+                        and not has_cell(jumps_low, jumps_high, landing)):
+                    jumps_low |= CELL_LOW[landing]
+                    jumps_high |= CELL_HIGH[landing]
+                    stack[stack_size] = landing
+                    stack_size += 1
+        targets_low |= jumps_low
+        targets_high |= jumps_high
+
+        for target in range(CELLS):
+            if has_cell(targets_low, targets_high, target):
+                move_from[move_count] = piece
+                move_to[move_count] = target
+                move_count += 1
+    return move_count
+
+@njit(cache=True)
+def evaluate(player_low, player_high, opponent_low, opponent_high):
+    score = 0
+    for cell in range(CELLS):
+        if has_cell(player_low, player_high, cell):
+            score += PLAYER_WEIGHTS[cell]
+        elif has_cell(opponent_low, opponent_high, cell):
+            score -= OPPONENT_WEIGHTS[cell]
+    return score
+
+@njit(cache=True)
+def alphabeta(player_low, player_high, opponent_low, opponent_high, depth, alpha, beta, is_maximizing,
+              move_from, move_to, stack, counters):
+    """
+    Same search as minimax_algo.minimax, but with an explicit stack of nodes instead of recursion
+    (numba can't reload recursive functions from its cache). The node at 'ply' keeps its moves
+    in row depth - ply of move_from/move_to.
+    """
+    players_low = np.empty(depth + 1, dtype=np.uint64)
+    players_high = np.empty(depth + 1, dtype=np.uint64)
+    opponents_low = np.empty(depth + 1, dtype=np.uint64)
+    opponents_high = np.empty(depth + 1, dtype=np.uint64)
+    alphas = np.empty(depth + 1, dtype=np.int64)
+    betas = np.empty(depth + 1, dtype=np.int64)
+    best_scores = np.empty(depth + 1, dtype=np.int64)
+    move_counts = np.zeros(depth + 1, dtype=np.int64)
+    next_moves = np.zeros(depth + 1, dtype=np.int64)
+
+    players_low[0] = player_low
+    players_high[0] = player_high
+    opponents_low[0] = opponent_low
+    opponents_high[0] = opponent_high
+    alphas[0] = alpha
+    betas[0] = beta
+
+    ply = 0
+    entering = True  # False when we come back to 'ply' with the score of one of its children
+    score = 0
+    while True:
+        maximizing = is_maximizing if ply % 2 == 0 else not is_maximizing
+        row = depth - ply
+
+        if entering:
+            counters[STATES] += 1
+            if row == 0:
+                counters[LEAF_PATHS] += 1
+                score = evaluate(players_low[ply], players_high[ply], opponents_low[ply], opponents_high[ply])
+                if ply == 0:
+                    return score
+                ply -= 1
+                entering = False
+                continue
+
+            occupied_low = players_low[ply] | opponents_low[ply]
+            occupied_high = players_high[ply] | opponents_high[ply]
+            if maximizing:
+                move_counts[ply] = generate_moves(players_low[ply], players_high[ply], occupied_low, occupied_high,
+                                                  move_from[row], move_to[row], stack)
+                best_scores[ply] = -INF
+            else:
+                move_counts[ply] = generate_moves(opponents_low[ply], opponents_high[ply], occupied_low, occupied_high,
+                                                  move_from[row], move_to[row], stack)
+                best_scores[ply] = INF
+            next_moves[ply] = 0
+        else:
+            if maximizing:
+                best_scores[ply] = max(best_scores[ply], score)
+                alphas[ply] = max(alphas[ply], score)
+            else:
+                best_scores[ply] = min(best_scores[ply], score)
+                betas[ply] = min(betas[ply], score)
+            if betas[ply] <= alphas[ply]:
+                move_counts[ply] = next_moves[ply]  # Prune the branch
+
+        i = next_moves[ply]
+        if i < move_counts[ply]:
+            # play_move into the child node
+            next_moves[ply] = i + 1
+            piece = move_from[row, i]
+            move = move_to[row, i]
+            child = ply + 1
+            players_low[child] = players_low[ply]
+            players_high[child] = players_high[ply]
+            opponents_low[child] = opponents_low[ply]
+            opponents_high[child] = opponents_high[ply]
+            if maximizing:
+                players_low[child] ^= CELL_LOW[piece] ^ CELL_LOW[move]
+                players_high[child] ^= CELL_HIGH[piece] ^ CELL_HIGH[move]
+            else:
+                opponents_low[child] ^= CELL_LOW[piece] ^ CELL_LOW[move]
+                opponents_high[child] ^= CELL_HIGH[piece] ^ CELL_HIGH[move]
+            alphas[child] = alphas[ply]
+            betas[child] = betas[ply]
+            ply = child
+            entering = True
+        else:
+            counters[MOVES] += next_moves[ply]
+            score = best_scores[ply]
+            if ply == 0:
+                return score
+            ply -= 1
+            entering = False
+
+@njit(cache=True)
+def root_search(player_low, player_high, opponent_low, opponent_high, depth, move_from, move_to, stack, counters):
+    """
+    Same root loop as minimax_algo.best_move, returns (from index, to index), (-1, -1) without moves.
+    """
+    occupied_low = player_low | opponent_low
+    occupied_high = player_high | opponent_high
+    move_count = generate_moves(player_low, player_high, occupied_low, occupied_high,
+                                move_from[depth], move_to[depth], stack)
+    best_score = -INF - 1
+    best_from, best_to = -1, -1
+    alpha, beta = -INF, INF
+    for i in range(move_count):
+        piece = move_from[depth, i]
+        move = move_to[depth, i]
+        new_player_low = player_low ^ CELL_LOW[piece] ^ CELL_LOW[move]
+        new_player_high = player_high ^ CELL_HIGH[piece] ^ CELL_HIGH[move]
+        score = alphabeta(new_player_low, new_player_high, opponent_low, opponent_high, depth - 1,
+                          alpha, beta, False, move_from, move_to, stack, counters)
+        if score > best_score:
+            best_score = score
+            best_from, best_to = piece, move
+        alpha = max(alpha, score)
+    return best_from, best_to
+
+
+def search_buffers(depth):
+    move_from = np.zeros((depth + 1, MAX_SIDE_MOVES), dtype=np.int64)
+    move_to = np.zeros((depth + 1, MAX_SIDE_MOVES), dtype=np.int64)
+    stack = np.zeros(CELLS, dtype=np.int64)
+    counters = np.zeros(3, dtype=np.int64)
+    return move_from, move_to, stack, counters
+
+def record_stats(counters, stats):
+    """
+    Adds the compiled search counters to a search_statistics.SearchStats (the numba search
+    only counts nodes, leaves and moves).
+    """
+    if stats is not None:
+        stats.nodes += int(counters[STATES])
+        stats.leaves += int(counters[LEAF_PATHS])
+        stats.moves += int(counters[MOVES])
+
+def to_score(value):
+    if value >= INF:
+        return math.inf
+    if value <= -INF:
+        return -math.inf
+    return int(value)
+
+def to_bound(value):
+    if value == math.inf:
+        return INF
+    if value == -math.inf:
+        return -INF
+    return int(value)
+
+def minimax(bitboard_player, bitboard_opponent, bitboard_occupied, depth, alpha, beta, is_maximizing, stats=None):
+    """
+    Drop-in replacement for minimax_algo.minimax (bitboard_occupied is recomputed from the two sides).
+    """
+    move_from, move_to, stack, counters = search_buffers(depth)
+    score = alphabeta(*split_limbs(bitboard_player), *split_limbs(bitboard_opponent), depth,
+                      to_bound(alpha), to_bound(beta), is_maximizing, move_from, move_to, stack, counters)
+    record_stats(counters, stats)
+    return to_score(score)
+
+def best_move(bitboard_player, bitboard_opponent, bitboard_occupied, depth=4, verbose=False, time_limit_ms=None,
+              stats=None):
+    """
+    Find the best move for the AI, same result as minimax_algo.best_move (a packed move).
+    With 'time_limit_ms' it deepens iteratively up to 'depth' and returns (packed move, depth reached).
+    The compiled search can't be stopped halfway, so a depth is only started when the growth of
+    the previous iterations says it should finish within the budget.
+    Pass a search_statistics.SearchStats as 'stats' to get the search counters back.
+    """
+    if stats is None and verbose:
+        stats = SearchStats()
+
+    known = instant_move(bitboard_player, bitboard_opponent, verbose, depth)
+    if known is not None:
+        if stats is not None:
+            stats.depth_reached = known[1]
+            stats.race_distance = known[2]
+        return known[0] if time_limit_ms is None else known[:2]
+
+    move_from, move_to, stack, counters = search_buffers(depth)
+    start = time.perf_counter()
+    if time_limit_ms is None:
+        best_from, best_to = root_search(*split_limbs(bitboard_player), *split_limbs(bitboard_opponent), depth,
+                                         move_from, move_to, stack, counters)
+        iteration_times = [time.perf_counter() - start]
+        depth_reached = depth
+    else:
+        deadline = start + time_limit_ms / 1000
+        iteration_times = []
+        best_from, best_to, depth_reached = -1, -1, 0
+        for iteration_depth in range(1, depth + 1):
+            now = time.perf_counter()
+            if iteration_times:
+                growth = iteration_times[-1] / iteration_times[-2] if len(iteration_times) > 1 and iteration_times[-2] > 0 else 10
+                if now + iteration_times[-1] * growth > deadline:
+                    break
+            best_from, best_to = root_search(*split_limbs(bitboard_player), *split_limbs(bitboard_opponent),
+                                             iteration_depth, move_from, move_to, stack, counters)
+            iteration_times.append(time.perf_counter() - now)
+            depth_reached = iteration_depth
+            if best_from < 0:
+                break
+    if stats is not None:
+        record_stats(counters, stats)
+        stats.elapsed += time.perf_counter() - start
+        first_depth = depth_reached - len(iteration_times) + 1
+        stats.iteration_times.extend([first_depth + i, seconds] for i, seconds in enumerate(iteration_times))
+        stats.depth_reached = depth_reached
+
+    if verbose:
+        print()
+        print("Search stats (numba):", stats.to_json())
+
+    move = None if best_from < 0 else encode_move(int(best_from), int(best_to))
+    if time_limit_ms is None:
+        return move
+    return move, depth_reached
@@ -0,0 +1,107 @@
+from bit_board_masks import ROW_MASKS
+from bit_board_logic import decode_move
+
+# Move ordering for alpha-beta: the sooner the best move is searched, the more of the others are pruned.
+# Order of the moves of a node:
+#   1. the move stored in the transposition table for the position (best move of an earlier search)
+#   2. the two killer moves of the depth (moves that caused a cutoff in a sibling node)
+#   3. the rest by row gain towards the goal, then by history (how often the move caused cutoffs)
+
+CELLS = 81
+
+row_of_index = [0] * CELLS
+for row, row_mask in enumerate(ROW_MASKS):
+    for index in range(CELLS):
+        if (row_mask >> index) & 1:
+            row_of_index[index] = row
+
+# History scores stay below 1 << ROW_GAIN_SHIFT so the row gain always comes first
+ROW_GAIN_SHIFT = 20
+HISTORY_LIMIT = 1 << ROW_GAIN_SHIFT
+
+# Static score of every packed move for each side, the AI (player2) moves up to row 0,
+# the human (player1) moves down to row 16
+ai_row_gain = [0] * (CELLS << 7)
+human_row_gain = [0] * (CELLS << 7)
+for move in range(CELLS << 7):
+    from_index, to_index = decode_move(move)
+    if from_index < CELLS and to_index < CELLS:
+        gain = row_of_index[from_index] - row_of_index[to_index]
+        ai_row_gain[move] = gain << ROW_GAIN_SHIFT
+        human_row_gain[move] = -gain << ROW_GAIN_SHIFT
+
+class MoveOrdering:
+    """
+    Killer moves and history table, kept for a whole search (and aged between searches).
+    Killers are indexed by the remaining depth, which is the ply within one search.
+    """
+    def __init__(self, max_depth=64):
+        self.max_depth = max_depth
+        self.killers = [[None, None] for _ in range(max_depth + 1)]
+        # history[is_maximizing][packed move]
+        self.history = [[0] * (CELLS << 7), [0] * (CELLS << 7)]
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.nodes = 0  # nodes whose moves were ordered
+
+    def new_search(self):
+        """
+        Called before every root search: the killers are cleared and the history is halved,
+        so the table follows the current position.
+        """
+        self.killers = [[None, None] for _ in range(self.max_depth + 1)]
+        for history in self.history:
+            for move in range(CELLS << 7):
+                if history[move]:
+                    history[move] >>= 1
+
+    def order(self, move_list, tt_move, depth, is_maximizing):
+        self.nodes += 1
+        history = self.history[is_maximizing]
+        row_gain = ai_row_gain if is_maximizing else human_row_gain
+        ordered = sorted(move_list, key=lambda move: row_gain[move] + history[move], reverse=True)
+
+        first_moves = []
+        if tt_move is not None:
+            first_moves.append(tt_move)
+        if depth <= self.max_depth:
+            for killer in self.killers[depth]:
+                if killer is not None and killer != tt_move:
+                    first_moves.append(killer)
+        # Killers and stored moves from another position may not be legal here
+        for move in reversed(first_moves):
+            if move in move_list:
+                ordered.remove(move)
+                ordered.insert(0, move)
+        return ordered
+
+    def record_cutoff(self, move, depth, is_maximizing, move_number):
+        """
+        'move' caused a beta (or alpha) cutoff, it was the 'move_number'-th move searched (from 1).
+        """
+        self.cutoffs += 1
+        if move_number == 1:
+            self.first_move_cutoffs += 1
+
+        if depth <= self.max_depth:
+            killers = self.killers[depth]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+
+        history = self.history[is_maximizing]
+        history[move] += depth * depth
+        if history[move] >= HISTORY_LIMIT:
+            for other in range(CELLS << 7):
+                history[other] >>= 1
+
+    def stats(self):
+        return {
+            "ordered_nodes": self.nodes,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+        }
@@ -0,0 +1,177 @@
+import argparse
+import mmap
+import multiprocessing
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bit_board_masks import player1_pieces, player2_pieces
+from bit_board_logic import side_moves, play_packed_move
+from transposition_table import zobrist_hash
+
+# Opening book
+# The first moves of a game are the most expensive to search (every piece can move) and the same
+# positions come back every game, so they are searched once, deeply and offline, and stored in a file.
+# File layout: a 16 byte header (magic, format version, record count) then fixed size records
+# (Zobrist key of the position with the AI to move, best packed move, score, search depth) sorted
+# by key. best_move looks positions up with a binary search straight on the memory-mapped file,
+# so the book is never read into memory.
+
+BOOK_MAGIC = b"CCBOOK\0\0"
+BOOK_VERSION = 1
+HEADER = struct.Struct("<8sII")
+RECORD = struct.Struct("<QHiBx")  # 16 bytes
+KEY = struct.Struct("<Q")
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+
+
+#########################
+# Lookup
+#########################
+
+class OpeningBook:
+    def __init__(self, path=BOOK_PATH):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.record_count = HEADER.unpack_from(self.data, 0)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not an opening book of version {BOOK_VERSION}")
+        if HEADER.size + self.record_count * RECORD.size > len(self.data):
+            self.close()
+            raise ValueError(f"{path} is truncated")
+
+    def __len__(self):
+        return self.record_count
+
+    def probe(self, key):
+        """
+        (packed move, score, depth) stored for the Zobrist key, None if the position isn't in the book.
+        """
+        low, high = 0, self.record_count
+        while low < high:
+            middle = (low + high) // 2
+            middle_key, = KEY.unpack_from(self.data, HEADER.size + middle * RECORD.size)
+            if middle_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.record_count:
+            record_key, move, score, depth = RECORD.unpack_from(self.data, HEADER.size + low * RECORD.size)
+            if record_key == key:
+                return move, score, depth
+        return None
+
+    def lookup(self, bitboard_player, bitboard_opponent):
+        """
+        Book move of the AI (bitboard_player) to move, None if there is none. The move is checked
+        to be legal, in case of a key collision.
+        """
+        entry = self.probe(zobrist_hash(bitboard_player, bitboard_opponent, True))
+        if entry is None:
+            return None
+        move = entry[0]
+        if move not in side_moves(bitboard_player, bitboard_player | bitboard_opponent):
+            return None
+        return entry
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+_opened_book = None
+
+def get_opening_book(path=BOOK_PATH):
+    """
+    The book opened once per process, None if there is no (valid) book file.
+    """
+    global _opened_book
+    if _opened_book is None:
+        try:
+            _opened_book = OpeningBook(path)
+        except (OSError, ValueError):
+            _opened_book = False
+    return _opened_book or None
+
+
+#########################
+# Building
+#########################
+
+def search_position(args):
+    """
+    Worker: deep search of one AI to move position, returns a record tuple.
+    """
+    from minimax_algo import search_root, transposition_table, move_ordering
+    bitboard_player, bitboard_opponent, depth = args
+    if move_ordering is not None:
+        move_ordering.new_search()
+    move, score = search_root(bitboard_player, bitboard_opponent, bitboard_player | bitboard_opponent, depth,
+                              transposition_table, ordering=move_ordering)
+    return zobrist_hash(bitboard_player, bitboard_opponent, True), move, score, depth
+
+def human_replies(bitboard_player, bitboard_opponent):
+    """
+    Positions (AI, human) after every human move, the AI to move.
+    """
+    bitboard_occupied = bitboard_player | bitboard_opponent
+    positions = []
+    for move in side_moves(bitboard_opponent, bitboard_occupied):
+        _, new_opponent = play_packed_move(move, bitboard_occupied, bitboard_opponent)
+        positions.append((bitboard_player, new_opponent))
+    return positions
+
+def build_book(human_moves=2, depth=5, path=BOOK_PATH, workers=None, verbose=True):
+    """
+    Search every position where the AI is to move within the first 'human_moves' moves of the human
+    (who starts), the AI answering with its book move, and write the book to 'path'.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    records = {}
+    layer = human_replies(player2_pieces, player1_pieces)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for human_move in range(1, human_moves + 1):
+            start = time.perf_counter()
+            layer = list({zobrist_hash(ai, human, True): (ai, human) for ai, human in layer}.values())
+            layer = [(ai, human) for ai, human in layer if zobrist_hash(ai, human, True) not in records]
+            results = list(executor.map(search_position, [(ai, human, depth) for ai, human in layer], chunksize=4))
+            next_layer = []
+            for (ai, human), (key, move, score, _) in zip(layer, results):
+                if move is None:
+                    continue
+                records[key] = (move, score, depth)
+                if human_move < human_moves:
+                    _, new_ai = play_packed_move(move, ai | human, ai)
+                    next_layer.extend(human_replies(new_ai, human))
+            if verbose:
+                print(f"human move {human_move}: {len(layer)} positions in {time.perf_counter() - start:.1f} s")
+            layer = next_layer
+    write_book(records, path)
+    return len(records)
+
+def write_book(records, path=BOOK_PATH):
+    """
+    records: {key: (packed move, score, depth)}, written sorted by key (through a temporary file,
+    so readers never see half a book).
+    """
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(BOOK_MAGIC, BOOK_VERSION, len(records)))
+        for key in sorted(records):
+            move, score, depth = records[key]
+            file.write(RECORD.pack(key, move, int(score), depth))
+    os.replace(temporary_path, path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the opening book")
+    parser.add_argument("--human-moves", type=int, default=2, help="number of human moves covered")
+    parser.add_argument("--depth", type=int, default=5, help="search depth of every book position")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=BOOK_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = build_book(args.human_moves, args.depth, args.output, args.workers)
+    print(f"{count} positions written to {args.output} in {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,245 @@
+import argparse
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bit_board_masks import player1_pieces, player2_pieces
+from bit_board_logic import (iterate_bits, bit_to_index, encode_move, decode_move, play_packed_move, step_moves,
+                             jump_moves, flood_jump_moves, intermediate_jump_moves_table,
+                             intermediate_jump_moves_pext, side_moves_python, side_moves_native,
+                             get_native_move_generator)
+from bit_ops import load_backend
+
+# Perft: count the leaf nodes of the full move tree to a given depth.
+# This measures the raw speed of a move generator without the search around it, and since every
+# generator must find exactly the same moves, the counts double as a correctness check.
+# The two sides alternate, the side to move is always passed first (player1 starts the game).
+# The game is not stopped when a side wins, like in chess perft we only count moves.
+
+# perft(depth) from the initial all_pieces/player1_pieces/player2_pieces setup
+REFERENCE_COUNTS = {
+    1: 14,
+    2: 196,
+    3: 4_648,
+    4: 110_224,
+    5: 2_945_504,
+    6: 78_712_384,
+}
+
+
+#########################
+# Move generator backends
+#########################
+# Every backend returns the packed moves (see bit_board_logic.encode_move) of the side to move.
+
+def per_piece_generator(jump_closure):
+    def generate(bitboard_player, bitboard_occupied):
+        return [encode_move(bit_to_index(piece), bit_to_index(move))
+                for piece in iterate_bits(bitboard_player)
+                for move in iterate_bits(step_moves(piece, bitboard_occupied) | jump_closure(piece, bitboard_occupied))]
+    return generate
+
+def pext_generator(bit_ops_name):
+    bit_ops = load_backend(bit_ops_name)
+    if bit_ops is None:
+        return None
+    single_jumps = lambda piece, occupied: intermediate_jump_moves_pext(piece, occupied, bit_ops)
+    return per_piece_generator(lambda piece, occupied: jump_moves(piece, occupied, single_jumps))
+
+def numba_generator():
+    try:
+        import numpy as np
+        import minimax_numba
+    except ImportError:
+        return None
+    move_from = np.zeros(minimax_numba.MAX_SIDE_MOVES, dtype=np.int64)
+    move_to = np.zeros(minimax_numba.MAX_SIDE_MOVES, dtype=np.int64)
+    stack = np.zeros(minimax_numba.CELLS, dtype=np.int64)
+
+    def generate(bitboard_player, bitboard_occupied):
+        move_count = minimax_numba.generate_moves(*minimax_numba.split_limbs(bitboard_player),
+                                                  *minimax_numba.split_limbs(bitboard_occupied),
+                                                  move_from, move_to, stack)
+        return [encode_move(int(move_from[i]), int(move_to[i])) for i in range(move_count)]
+    return generate
+
+BACKENDS = {
+    "table": lambda: per_piece_generator(
+        lambda piece, occupied: jump_moves(piece, occupied, intermediate_jump_moves_table)),
+    "pext-python": lambda: pext_generator("python"),
+    "pext-native": lambda: pext_generator("native"),
+    "flood": lambda: per_piece_generator(flood_jump_moves),
+    "side-python": lambda: side_moves_python,
+    "side-native": lambda: side_moves_native if get_native_move_generator() is not None else None,
+    "numba": numba_generator,
+}
+# "numpy" (bit_board_numpy.batch_moves) works on whole layers of positions at once, see perft_numpy
+
+def get_generator(backend):
+    generator = BACKENDS[backend]()
+    if generator is None:
+        raise RuntimeError(f"perft backend {backend!r} is not available here")
+    return generator
+
+
+#########################
+# Perft
+#########################
+
+def count_leaves(bitboard_player, bitboard_opponent, depth, generate, table):
+    if depth == 0:
+        return 1
+    bitboard_occupied = bitboard_player | bitboard_opponent
+    move_list = generate(bitboard_player, bitboard_occupied)
+    if depth == 1:
+        return len(move_list)
+
+    if table is not None:
+        key = (bitboard_player, bitboard_opponent, depth)
+        if key in table:
+            return table[key]
+
+    nodes = 0
+    for move in move_list:
+        new_occupied, new_player = play_packed_move(move, bitboard_occupied, bitboard_player)
+        # The other side moves next
+        nodes += count_leaves(bitboard_opponent, new_player, depth - 1, generate, table)
+
+    if table is not None:
+        table[key] = nodes
+    return nodes
+
+def divide_worker(args):
+    bitboard_player, bitboard_opponent, depth, backend, use_hash = args
+    return count_leaves(bitboard_player, bitboard_opponent, depth, get_generator(backend), {} if use_hash else None)
+
+def divide(depth, bitboard_player=player1_pieces, bitboard_opponent=player2_pieces,
+           backend="table", use_hash=False, parallel=False):
+    """
+    Leaf count below every root move: {packed move: count}.
+    'use_hash' reuses counts of positions reached through different move orders,
+    'parallel' spreads the root moves over a process pool.
+    """
+    if depth < 1:
+        raise ValueError("divide needs a depth of at least 1")
+    generate = get_generator(backend)
+    bitboard_occupied = bitboard_player | bitboard_opponent
+    root_moves = generate(bitboard_player, bitboard_occupied)
+    children = []
+    for move in root_moves:
+        new_occupied, new_player = play_packed_move(move, bitboard_occupied, bitboard_player)
+        children.append((bitboard_opponent, new_player, depth - 1, backend, use_hash))
+
+    if parallel:
+        with ProcessPoolExecutor(max_workers=multiprocessing.cpu_count()) as executor:
+            counts = list(executor.map(divide_worker, children))
+    else:
+        table = {} if use_hash else None
+        counts = [count_leaves(player, opponent, child_depth, generate, table)
+                  for player, opponent, child_depth, _, _ in children]
+    return dict(zip(root_moves, counts))
+
+def perft(depth, bitboard_player=player1_pieces, bitboard_opponent=player2_pieces,
+          backend="table", use_hash=False, parallel=False):
+    if depth == 0:
+        return 1
+    if backend == "numpy":
+        return perft_numpy(depth, bitboard_player, bitboard_opponent)
+    if parallel:
+        return sum(divide(depth, bitboard_player, bitboard_opponent, backend, use_hash, parallel).values())
+    table = {} if use_hash else None
+    return count_leaves(bitboard_player, bitboard_opponent, depth, get_generator(backend), table)
+
+def perft_numpy(depth, bitboard_player=player1_pieces, bitboard_opponent=player2_pieces, batch_size=4096):
+    """
+    Layer by layer perft with bit_board_numpy.batch_moves: every position of a layer is expanded
+    at once, and the last layer is only counted.
+    """
+    import numpy as np
+    from bit_board_numpy import batch_moves, to_limbs, CELL_LOW, CELL_HIGH
+
+    (player_low, player_high), (opponent_low, opponent_high) = to_limbs([bitboard_player]), to_limbs([bitboard_opponent])
+    for remaining in range(depth, 0, -1):
+        leaves = 0
+        children = []
+        for i in range(0, len(player_low), batch_size):
+            batch = slice(i, i + batch_size)
+            moves_low, moves_high = batch_moves(player_low[batch] | opponent_low[batch],
+                                                player_high[batch] | opponent_high[batch],
+                                                player_low[batch], player_high[batch])
+            if remaining == 1:
+                leaves += int((np.bitwise_count(moves_low) + np.bitwise_count(moves_high)).sum())
+                continue
+
+            # One child per (position, piece, destination), then the other side is to move
+            for target in range(81):
+                position, piece = np.nonzero(((moves_low & CELL_LOW[target]) | (moves_high & CELL_HIGH[target])) != 0)
+                position += i
+                children.append((opponent_low[position], opponent_high[position],
+                                 player_low[position] ^ CELL_LOW[piece] ^ CELL_LOW[target],
+                                 player_high[position] ^ CELL_HIGH[piece] ^ CELL_HIGH[target]))
+        if remaining == 1:
+            return leaves
+        player_low, player_high, opponent_low, opponent_high = (np.concatenate(part) for part in zip(*children))
+    return len(player_low)
+
+
+#########################
+# Reporting
+#########################
+
+def move_name(move):
+    from_index, to_index = decode_move(move)
+    return f"{from_index}-{to_index}"
+
+def timed_perft(depth, backend="table", use_hash=False, parallel=False, **position):
+    start = time.perf_counter()
+    nodes = perft(depth, backend=backend, use_hash=use_hash, parallel=parallel, **position)
+    elapsed = time.perf_counter() - start
+    nodes_per_second = nodes / elapsed if elapsed > 0 else math.inf
+    return nodes, elapsed, nodes_per_second
+
+def check_backends(depth, backends=None, use_hash=False):
+    """
+    Run every available backend against REFERENCE_COUNTS and print their speed.
+    Returns {backend: nodes/s}, raises AssertionError on a wrong count.
+    """
+    expected = REFERENCE_COUNTS[depth]
+    speeds = {}
+    for backend in backends or list(BACKENDS) + ["numpy"]:
+        try:
+            nodes, elapsed, nodes_per_second = timed_perft(depth, backend, use_hash)
+        except (RuntimeError, ImportError) as error:
+            print(f"{backend:>12}: skipped ({error})")
+            continue
+        assert nodes == expected, f"{backend} perft({depth}) = {nodes}, expected {expected}"
+        speeds[backend] = nodes_per_second
+        print(f"{backend:>12}: {nodes} nodes in {elapsed:.3f} s, {nodes_per_second:,.0f} nodes/s")
+    return speeds
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count move tree leaves from the initial position")
+    parser.add_argument("depth", type=int)
+    parser.add_argument("--backend", default="table", choices=list(BACKENDS) + ["numpy"])
+    parser.add_argument("--hash", action="store_true", help="reuse counts of transposed positions")
+    parser.add_argument("--parallel", action="store_true", help="split the root moves over all cores")
+    parser.add_argument("--divide", action="store_true", help="print the count below every root move")
+    parser.add_argument("--check", action="store_true", help="check and time every backend against the reference counts")
+    args = parser.parse_args()
+
+    if args.check:
+        check_backends(args.depth, use_hash=args.hash)
+    elif args.divide:
+        start = time.perf_counter()
+        counts = divide(args.depth, backend=args.backend, use_hash=args.hash, parallel=args.parallel)
+        elapsed = time.perf_counter() - start
+        for move, count in counts.items():
+            print(f"{move_name(move)}: {count}")
+        total = sum(counts.values())
+        print(f"\nMoves: {len(counts)}, nodes: {total}, {elapsed:.3f} s, {total / elapsed:,.0f} nodes/s")
+    else:
+        nodes, elapsed, nodes_per_second = timed_perft(args.depth, args.backend, args.hash, args.parallel)
+        if args.depth in REFERENCE_COUNTS and nodes != REFERENCE_COUNTS[args.depth]:
+            print(f"WRONG, expected {REFERENCE_COUNTS[args.depth]}")
+        print(f"perft({args.depth}) = {nodes}, {elapsed:.3f} s, {nodes_per_second:,.0f} nodes/s")
@@ -0,0 +1,117 @@
+import math
+import multiprocessing
+
+from bit_board_logic import side_moves, play_packed_move
+from minimax_algo import minimax
+from minimax_algo_parallelize import best_move_hybrid
+from engine_pool import EnginePool, get_engine_pool, use_engine_pool
+
+# Pondering: search on the human's time.
+# After the AI has moved, the most likely human replies are guessed with a shallow search and the
+# AI answer to each of them is searched in background processes while the human thinks. When the
+# human plays one of them the answer is ready (or already well under way), otherwise the
+# background searches are killed and the AI searches as usual.
+# A predicted answer is searched with the search function and settings the AI plays with, so a hit
+# plays what the AI would have played. A background process can't start processes of its own, its
+# search runs on a thread engine pool with as many workers as the pool of the game (same batches).
+
+def likely_replies(bitboard_player, bitboard_opponent, count):
+    """
+    The 'count' human moves that leave the AI with the worst position after its best answer.
+    """
+    bitboard_occupied = bitboard_player | bitboard_opponent
+    scored_moves = []
+    for move in side_moves(bitboard_opponent, bitboard_occupied):
+        new_occupied, new_opponent = play_packed_move(move, bitboard_occupied, bitboard_opponent)
+        scored_moves.append((minimax(bitboard_player, new_opponent, new_occupied, 1, -math.inf, math.inf, True), move))
+    scored_moves.sort()
+    return [move for _, move in scored_moves[:count]]
+
+def start_ponder_worker(search_workers):
+    """
+    Pool initializer: the engine pool of the worker's searches.
+    """
+    use_engine_pool(EnginePool(search_workers, threads=True))
+
+def ponder_search(args):
+    """
+    Worker: the AI move of one predicted position.
+    """
+    bitboard_player, bitboard_opponent, search, depth, time_limit_ms = args
+    bitboard_occupied = bitboard_player | bitboard_opponent
+    if time_limit_ms is None:
+        return search(bitboard_player, bitboard_opponent, bitboard_occupied, depth=depth)
+    return search(bitboard_player, bitboard_opponent, bitboard_occupied, depth=depth,
+                  time_limit_ms=time_limit_ms)[0]
+
+class Ponderer:
+    """
+    start() after every AI move, take() when the human has moved.
+    'search', 'depth' and 'time_limit_ms' are those the AI plays with (search(..., depth=depth) or
+    search(..., depth=depth, time_limit_ms=time_limit_ms)[0] gives its move).
+    A multiprocessing.Pool is used (not a ProcessPoolExecutor) because searches of wrong
+    predictions must be stopped right away, which Pool.terminate() does.
+    """
+    def __init__(self, replies=4, depth=4, time_limit_ms=None, workers=None, search=best_move_hybrid):
+        self.replies = replies
+        self.depth = depth
+        self.time_limit_ms = time_limit_ms
+        self.search = search
+        self.workers = workers or min(replies, multiprocessing.cpu_count())
+        self.pool = None
+        self.predictions = {}  # (AI, human) position -> AsyncResult of its AI move
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, bitboard_player, bitboard_opponent):
+        """
+        The AI just moved, the human (bitboard_opponent) is to move.
+        """
+        self.stop()
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers, initializer=start_ponder_worker,
+                                             initargs=(get_engine_pool().workers,))
+        bitboard_occupied = bitboard_player | bitboard_opponent
+        # Most likely reply first, it is searched first
+        for move in likely_replies(bitboard_player, bitboard_opponent, self.replies):
+            _, new_opponent = play_packed_move(move, bitboard_occupied, bitboard_opponent)
+            self.predictions[(bitboard_player, new_opponent)] = self.pool.apply_async(
+                ponder_search, ((bitboard_player, new_opponent, self.search, self.depth, self.time_limit_ms),))
+
+    def take(self, bitboard_player, bitboard_opponent):
+        """
+        The human moved to this position: (True, AI move) if it was predicted (waits for its search
+        to finish), (False, None) otherwise. The other predictions are dropped either way.
+        """
+        result = self.predictions.pop((bitboard_player, bitboard_opponent), None)
+        if result is None:
+            if self.predictions:
+                self.misses += 1
+            self.stop()
+            return False, None
+        self.hits += 1
+        move = result.get()
+        self.stop()
+        return True, move
+
+    def stop(self):
+        """
+        Forget the predictions, killing the searches still running.
+        """
+        if any(not result.ready() for result in self.predictions.values()):
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.predictions.clear()
+
+    def close(self):
+        self.predictions.clear()
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def stats(self):
+        predicted = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / predicted if predicted else 0.0}
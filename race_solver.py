@@ -0,0 +1,126 @@
+import math
+
+from bit_board_masks import winning_masks
+from bit_board_logic import side_moves, packed_move_masks
+from move_ordering import row_of_index, ai_row_gain
+
+# Race endgames
+# Once every AI piece is on a row above every human piece, the armies have passed each other: the AI
+# runs to the top and the human to the bottom, and a piece would have to go backwards to touch the
+# other army again, which never shortens a race. From there each side just needs the smallest number
+# of moves to fill its target with its own pieces, a single player puzzle that we solve exactly with
+# IDA* over that side's bitboard (the other army is ignored, it is behind).
+#
+# The AI (bitboard_player, player2) fills winning_masks[1], the human fills winning_masks[0].
+
+AI_TARGET = winning_masks[1]
+HUMAN_TARGET = winning_masks[0]
+
+MAX_MEMO_POSITIONS = 1_000_000  # the memo tables are emptied past this size
+
+class RaceBudgetExceeded(Exception):
+    pass
+
+def is_disengaged(bitboard_player, bitboard_opponent):
+    """
+    True when the lowest AI piece is on a row above the highest human piece and no piece is still
+    sitting in the other side's target. Rows are contiguous index ranges, so the lowest AI piece is
+    its highest bit and the highest human piece is its lowest bit.
+    """
+    if not bitboard_player or not bitboard_opponent:
+        return False
+    if bitboard_player & HUMAN_TARGET or bitboard_opponent & AI_TARGET:
+        return False
+    lowest_ai_row = row_of_index[bitboard_player.bit_length() - 1]
+    highest_human_row = row_of_index[(bitboard_opponent & -bitboard_opponent).bit_length() - 1]
+    return lowest_ai_row < highest_human_row
+
+class RaceSolver:
+    """
+    Exact number of moves for one side to fill 'target', by IDA*. Lower bounds proven by failed
+    iterations and exact distances are memoized by position, across calls.
+    'row_gain' is move_ordering.ai_row_gain or human_row_gain, used to try forward moves first.
+    """
+    def __init__(self, target, row_gain):
+        self.target = target
+        self.row_gain = row_gain
+        self.lower_bounds = {}
+        self.distances = {}
+        self.nodes = 0
+
+    def heuristic(self, pieces):
+        # Every piece outside the target needs at least one move
+        outside = (pieces & ~self.target).bit_count()
+        return max(outside, self.lower_bounds.get(pieces, 0))
+
+    def solve(self, pieces, node_budget=200_000):
+        """
+        Returns (distance, first move of an optimal line), (0, None) if the target is already full.
+        Raises RaceBudgetExceeded after 'node_budget' nodes.
+        """
+        if pieces == self.target:
+            return 0, None
+        if pieces in self.distances and self.distances[pieces][1] is not None:
+            return self.distances[pieces]
+        if len(self.lower_bounds) > MAX_MEMO_POSITIONS:
+            self.lower_bounds.clear()
+        if len(self.distances) > MAX_MEMO_POSITIONS:
+            self.distances.clear()
+        self.nodes = 0
+        bound = self.heuristic(pieces)
+        while True:
+            path = []
+            result = self.search(pieces, 0, bound, path, node_budget)
+            if result is True:
+                # Every position on the line is now solved too
+                for ply, move in enumerate(path):
+                    self.distances[pieces] = (bound - ply, move)
+                    pieces ^= packed_move_masks[move]
+                return bound, path[0]
+            if result == math.inf:
+                raise RaceBudgetExceeded("the target can't be filled")
+            bound = result
+
+    def search(self, pieces, moves_played, bound, path, node_budget):
+        self.nodes += 1
+        if self.nodes > node_budget:
+            raise RaceBudgetExceeded(f"more than {node_budget} nodes")
+        estimate = moves_played + self.heuristic(pieces)
+        if estimate > bound:
+            return estimate
+        if pieces == self.target:
+            return True
+
+        next_bound = math.inf
+        row_gain = self.row_gain
+        # Only our own pieces are on the board, they are also the only pieces to jump over
+        for move in sorted(side_moves(pieces, pieces), key=row_gain.__getitem__, reverse=True):
+            path.append(move)
+            result = self.search(pieces ^ packed_move_masks[move], moves_played + 1, bound, path, node_budget)
+            if result is True:
+                return True
+            path.pop()
+            next_bound = min(next_bound, result)
+
+        # Nothing within 'bound' from here: the distance is at least next_bound - moves_played
+        self.lower_bounds[pieces] = max(self.lower_bounds.get(pieces, 0), next_bound - moves_played)
+        return next_bound
+
+ai_race_solver = RaceSolver(AI_TARGET, ai_row_gain)
+
+def race_move(bitboard_player, bitboard_opponent, node_budget=200_000):
+    """
+    Best AI move of a disengaged position, (packed move, AI moves left), None if the position
+    isn't disengaged, the solver ran out of nodes, or its move isn't legal with the human pieces on
+    the board (the normal search then takes over).
+    """
+    if not is_disengaged(bitboard_player, bitboard_opponent):
+        return None
+    try:
+        distance, move = ai_race_solver.solve(bitboard_player, node_budget)
+    except RaceBudgetExceeded:
+        return None
+    # The solver only sees the AI pieces: a human piece may block its step or landing square
+    if move is None or move not in side_moves(bitboard_player, bitboard_player | bitboard_opponent):
+        return None
+    return move, distance
@@ -0,0 +1,74 @@
+import json
+from dataclasses import dataclass, field, asdict
+
+# Counters filled by the search when a SearchStats is passed to it (best_move(..., stats=...)).
+# Without one the search skips all the counting.
+
+CUTOFF_SLOTS = 8  # cutoffs on the 1st, 2nd, ... 7th move searched, the last slot counts all the later ones
+
+@dataclass
+class SearchStats:
+    nodes: int = 0
+    leaves: int = 0
+    moves: int = 0  # moves searched at the inner nodes
+    cutoffs_by_move: list = field(default_factory=lambda: [0] * CUTOFF_SLOTS)
+    tt_hits: int = 0
+    tt_cutoffs: int = 0  # the stored score was enough, the node wasn't searched
+    nodes_per_depth: dict = field(default_factory=dict)  # remaining depth -> nodes
+    iteration_times: list = field(default_factory=list)  # [depth, seconds] of every finished search
+    elapsed: float = 0.0
+    depth_reached: int = 0
+    race_distance: int = None  # AI moves left when the race solver played the move (no search then)
+    refuted: int = 0  # root moves of a parallel search dropped once under the shared alpha
+
+    @property
+    def cutoffs(self):
+        return sum(self.cutoffs_by_move)
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.cutoffs_by_move[0] / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def branching_factor(self):
+        inner_nodes = self.nodes - self.leaves
+        return self.moves / inner_nodes if inner_nodes > 0 else 0.0
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def merge(self, other):
+        """
+        Add the counters of 'other' (a worker's search), times and depth are left to the caller.
+        """
+        self.nodes += other.nodes
+        self.leaves += other.leaves
+        self.moves += other.moves
+        self.cutoffs_by_move = [a + b for a, b in zip(self.cutoffs_by_move, other.cutoffs_by_move)]
+        self.tt_hits += other.tt_hits
+        self.tt_cutoffs += other.tt_cutoffs
+        self.refuted += other.refuted
+        for depth, nodes in other.nodes_per_depth.items():
+            self.nodes_per_depth[depth] = self.nodes_per_depth.get(depth, 0) + nodes
+
+    def to_dict(self):
+        result = asdict(self)
+        result["cutoffs"] = self.cutoffs
+        result["first_move_cutoff_rate"] = round(self.first_move_cutoff_rate, 4)
+        result["branching_factor"] = round(self.branching_factor, 2)
+        result["nodes_per_second"] = round(self.nodes_per_second)
+        return result
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, text):
+        """
+        Counters back from to_json (the derived values are dropped).
+        """
+        values = json.loads(text)
+        stats = cls(**{name: values[name] for name in cls.__dataclass_fields__ if name in values})
+        stats.nodes_per_depth = {int(depth): nodes for depth, nodes in stats.nodes_per_depth.items()}
+        return stats
@@ -0,0 +1,113 @@
+import struct
+import threading
+from multiprocessing import shared_memory
+
+from analysis_store import pack_data, unpack_data, encode_score, decode_score, NO_MOVE
+
+# Shared transposition table for Lazy SMP (see best_move_lazy_smp)
+# The same two entries per bucket as transposition_table.TranspositionTable (depth-preferred and
+# always-replace), in a multiprocessing.shared_memory block read and written by every worker without
+# any lock. Each entry is three 64 bit words: key, data (move, depth, flag and score packed as in
+# analysis_store.py) and key ^ data. A reader seeing the words of two different writes (a write in
+# progress in another process) gets a check word that doesn't match and takes it as a miss.
+
+ENTRY = struct.Struct("<QQQ")
+BUCKET_BYTES = 2 * ENTRY.size
+class SharedTranspositionTable:
+    """
+    Same probe/store interface as TranspositionTable, usable by minimax. The process that creates
+    it (name=None) owns the block and unlinks it in close(), the others attach to it by name.
+    """
+    def __init__(self, size=1 << 18, name=None):
+        if size & (size - 1):
+            raise ValueError("the transposition table size must be a power of two")
+        self.size = size
+        self.index_mask = size - 1
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=size * BUCKET_BYTES)
+        else:
+            # The workers share the resource tracker of the owner, which unlinks the block
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self.buffer = self.memory.buf
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.torn_reads = 0
+        self.stores = 0
+
+    def clear(self):
+        self.buffer[:] = bytes(len(self.buffer))
+        self.reset_stats()
+
+    def read(self, offset, key):
+        entry_key, data, check = ENTRY.unpack_from(self.buffer, offset)
+        if entry_key != key:
+            return None
+        if entry_key ^ data != check:
+            self.torn_reads += 1
+            return None
+        move, depth, flag, score = unpack_data(data)
+        return key, depth, flag, decode_score(score), (None if move == NO_MOVE else move)
+
+    def probe(self, key):
+        self.probes += 1
+        offset = (key & self.index_mask) * BUCKET_BYTES
+        entry = self.read(offset, key) or self.read(offset + ENTRY.size, key)
+        if entry is not None:
+            self.hits += 1
+        return entry
+
+    def store(self, key, depth, flag, score, move):
+        self.stores += 1
+        offset = (key & self.index_mask) * BUCKET_BYTES
+        data = pack_data(NO_MOVE if move is None else move, depth, flag, encode_score(score))
+        current_key, current_data, current_check = ENTRY.unpack_from(self.buffer, offset)
+        if current_key == 0 or current_key == key or depth >= (current_data >> 16) & 0xFF:
+            if current_key != 0 and current_key != key:
+                # The deeper slot's old entry still goes to the always-replace slot, with its own
+                # check word: an entry torn by another writer stays torn instead of being validated
+                ENTRY.pack_into(self.buffer, offset + ENTRY.size, current_key, current_data, current_check)
+            ENTRY.pack_into(self.buffer, offset, key, data, key ^ data)
+        else:
+            ENTRY.pack_into(self.buffer, offset + ENTRY.size, key, data, key ^ data)
+
+    def close(self):
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def stats(self):
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            "torn_reads": self.torn_reads,
+            "stores": self.stores,
+        }
+
+_attached_tables = {}
+_attach_lock = threading.Lock()
+
+def attach_shared_table(name, size):
+    """
+    In a worker: the table 'name', attached once per process (shared by the threads of a thread pool).
+    """
+    with _attach_lock:
+        if name not in _attached_tables:
+            _attached_tables[name] = SharedTranspositionTable(size, name)
+        return _attached_tables[name]
+
+def detach_shared_tables():
+    """
+    Close the tables attached by this process. The workers of a thread pool attach in the process
+    of the pool, which calls this at shutdown so the mappings don't pile up across pool restarts.
+    """
+    with _attach_lock:
+        for table in _attached_tables.values():
+            table.close()
+        _attached_tables.clear()
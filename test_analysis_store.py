@@ -0,0 +1,46 @@
+import math
+import os
+
+import analysis_store
+from analysis_store import AnalysisStore
+from transposition_table import EXACT
+
+KEY = 0x123456789ABCDEF
+
+def test_store_and_probe(tmp_path):
+    store = AnalysisStore(str(tmp_path / "analysis.bin"), size_mb=1)
+    try:
+        assert store.probe(KEY) is None
+        assert store.store(KEY, 1234, 4, EXACT, -17)
+        assert store.probe(KEY) == (1234, 4, EXACT, -17)
+        # Depth-preferred: a shallower result doesn't replace a deeper one
+        assert not store.store(KEY, 99, 2, EXACT, 5)
+        assert store.probe(KEY) == (1234, 4, EXACT, -17)
+    finally:
+        store.close()
+
+def test_infinite_scores(tmp_path):
+    store = AnalysisStore(str(tmp_path / "analysis.bin"), size_mb=1)
+    try:
+        store.store(KEY, 1234, 4, EXACT, math.inf)
+        store.store(KEY + 1, 4321, 4, EXACT, -math.inf)
+        assert store.probe(KEY)[3] == math.inf
+        assert store.probe(KEY + 1)[3] == -math.inf
+    finally:
+        store.close()
+
+def test_other_evaluation_replaces_the_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "analysis.bin")
+    old_store = AnalysisStore(path, size_mb=1)
+    old_store.store(KEY, 1234, 4, EXACT, 3)
+    old_inode = os.stat(path).st_ino
+    monkeypatch.setattr(analysis_store, "EVAL_VERSION", analysis_store.EVAL_VERSION + 1)
+    new_store = AnalysisStore(path, size_mb=1)
+    try:
+        assert os.stat(path).st_ino != old_inode
+        assert new_store.probe(KEY) is None
+        # A process that still has the old store mapped keeps reading it
+        assert old_store.probe(KEY) == (1234, 4, EXACT, 3)
+    finally:
+        new_store.close()
+        old_store.close()
@@ -0,0 +1,11 @@
+import bit_ops
+import bit_board_logic
+from bit_board_masks import player1_pieces, player2_pieces
+from bit_board_logic import side_moves, side_moves_python
+
+def test_python_bit_ops_backend_uses_the_python_generator(monkeypatch):
+    monkeypatch.setattr(bit_ops, "active_backend", bit_ops.load_backend("python"))
+    monkeypatch.setattr(bit_board_logic, "native_move_generator", None)
+    assert bit_board_logic.get_native_move_generator() is None
+    occupied = player1_pieces | player2_pieces
+    assert side_moves(player2_pieces, occupied) == side_moves_python(player2_pieces, occupied)
@@ -0,0 +1,68 @@
+import os
+import signal
+
+import pytest
+
+import minimax_algo
+from backend_benchmark import benchmark_positions
+from distributed_search import RemotePool, best_move_distributed, start_local_workers, stop_local_workers
+from test_parallel_search import move_score, serial_score
+
+# The distributed search must pick a move as good as the serial search, also when workers die or hang
+# (their tasks go to another worker, or are searched here when none is left).
+
+POSITIONS = benchmark_positions(8)
+
+@pytest.fixture
+def workers(monkeypatch):
+    monkeypatch.setattr(minimax_algo, "use_opening_book", False)
+    monkeypatch.setattr(minimax_algo, "analysis_store_path", None)
+    monkeypatch.setattr(minimax_algo, "use_race_solver", False)
+    minimax_algo.clear_search_caches()
+    processes, addresses = start_local_workers(2)
+    yield processes, addresses
+    for process in processes:
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGCONT)
+    stop_local_workers(processes)
+
+def assert_scores_like_serial(pool, depth):
+    for bitboard_player, bitboard_opponent in POSITIONS:
+        move = best_move_distributed(bitboard_player, bitboard_opponent, bitboard_player | bitboard_opponent, depth,
+                                     pool=pool)
+        assert move_score(bitboard_player, bitboard_opponent, move, depth) == \
+            serial_score(bitboard_player, bitboard_opponent, depth)
+
+def test_distributed_move_scores_like_serial(workers):
+    pool = RemotePool(workers[1])
+    try:
+        assert_scores_like_serial(pool, 3)
+        assert pool.stats()["local_tasks"] == 0
+    finally:
+        pool.close()
+
+def test_killed_worker_tasks_go_to_the_other_one(workers):
+    processes, addresses = workers
+    pool = RemotePool(addresses)
+    try:
+        assert_scores_like_serial(pool, 2)  # both connections open
+        processes[0].kill()
+        processes[0].join()
+        assert_scores_like_serial(pool, 3)
+        assert pool.stats()["redispatched"] > 0
+    finally:
+        pool.close()
+
+@pytest.mark.skipif(not hasattr(signal, "SIGSTOP"), reason="needs SIGSTOP")
+def test_hung_workers_tasks_are_searched_here(workers):
+    processes, addresses = workers
+    pool = RemotePool(addresses, task_timeout=0.5)
+    try:
+        for process in processes:
+            os.kill(process.pid, signal.SIGSTOP)
+        assert_scores_like_serial(pool, 3)
+        stats = pool.stats()
+        assert stats["timeouts"] > 0
+        assert stats["local_tasks"] > 0
+    finally:
+        pool.close()
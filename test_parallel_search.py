@@ -0,0 +1,93 @@
+import math
+
+import pytest
+
+import minimax_algo
+import minimax_algo_parallelize
+import shared_transposition_table
+from backend_benchmark import benchmark_positions
+from bit_board_logic import side_moves, play_packed_move
+from engine_pool import EnginePool, use_engine_pool, shutdown_engine_pool
+from work_stealing import best_move_work_stealing
+
+# The parallel searches must pick a move as good as the serial search: the score of the chosen
+# move (searched on its own, full window) equals the best score of minimax_algo.search_root.
+
+POSITIONS = benchmark_positions(36)
+
+def move_score(bitboard_player, bitboard_opponent, move, depth):
+    bitboard_occupied, new_player = play_packed_move(move, bitboard_player | bitboard_opponent, bitboard_player)
+    return minimax_algo.minimax(new_player, bitboard_opponent, bitboard_occupied, depth - 1, -math.inf, math.inf,
+                                False)
+
+def serial_score(bitboard_player, bitboard_opponent, depth):
+    return minimax_algo.search_root(bitboard_player, bitboard_opponent, bitboard_player | bitboard_opponent, depth)[1]
+
+@pytest.fixture(params=[False, True], ids=["processes", "threads"])
+def pool(request, monkeypatch):
+    # Every move searched: no book, no stored analysis, no race solver
+    monkeypatch.setattr(minimax_algo, "use_opening_book", False)
+    monkeypatch.setattr(minimax_algo, "analysis_store_path", None)
+    monkeypatch.setattr(minimax_algo, "use_race_solver", False)
+    minimax_algo.clear_search_caches()
+    yield use_engine_pool(EnginePool(4, threads=request.param))
+    shutdown_engine_pool()
+
+@pytest.mark.parametrize("search", [minimax_algo_parallelize.best_move_parallelized,
+                                    minimax_algo_parallelize.best_move_lazy_smp,
+                                    best_move_work_stealing],
+                         ids=["parallelized", "lazy_smp", "work_stealing"])
+@pytest.mark.parametrize("depth", [3, 4])
+def test_parallel_move_scores_like_serial(pool, search, depth):
+    for bitboard_player, bitboard_opponent in POSITIONS:
+        move = search(bitboard_player, bitboard_opponent, bitboard_player | bitboard_opponent, depth)
+        assert move_score(bitboard_player, bitboard_opponent, move, depth) == \
+            serial_score(bitboard_player, bitboard_opponent, depth)
+
+@pytest.mark.parametrize("depth", [3, 4])
+def test_verify_pruned_moves_scores_like_serial(pool, depth):
+    # Every move a suspect, against the score of the median move: the best move is found with its exact score
+    for bitboard_player, bitboard_opponent in POSITIONS:
+        moves = side_moves(bitboard_player, bitboard_player | bitboard_opponent)
+        median_score = sorted(move_score(bitboard_player, bitboard_opponent, move, depth) for move in moves)[len(moves) // 2]
+        _, verified_score, verified_move = minimax_algo_parallelize.verify_pruned_moves(
+            bitboard_player, bitboard_opponent, depth, [(math.inf, move) for move in moves], median_score)
+        best_score = serial_score(bitboard_player, bitboard_opponent, depth)
+        if best_score == median_score:
+            assert verified_move is None
+        else:
+            assert verified_score == best_score
+            assert move_score(bitboard_player, bitboard_opponent, verified_move, depth) == best_score
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("depth", [3, 4])
+def test_hybrid_move_scores_like_serial(pool, seed, depth):
+    # The moves cut after the depth 2 search are all searched deep afterwards: no better move is lost
+    for bitboard_player, bitboard_opponent in benchmark_positions(20, seed):
+        move = minimax_algo_parallelize.best_move_hybrid(bitboard_player, bitboard_opponent,
+                                                         bitboard_player | bitboard_opponent, depth)
+        assert move_score(bitboard_player, bitboard_opponent, move, depth) == \
+            serial_score(bitboard_player, bitboard_opponent, depth)
+
+def test_numba_lazy_smp_reports_the_depth_completed(pool, monkeypatch):
+    monkeypatch.setattr(minimax_algo_parallelize, "engine", "numba")
+    bitboard_player, bitboard_opponent = POSITIONS[0]
+    bitboard_occupied = bitboard_player | bitboard_opponent
+    _, depth_reached = minimax_algo_parallelize.best_move_lazy_smp(bitboard_player, bitboard_opponent,
+                                                                   bitboard_occupied, 8, time_limit_ms=1)
+    assert depth_reached < 8
+    move, depth_reached = minimax_algo_parallelize.best_move_lazy_smp(bitboard_player, bitboard_opponent,
+                                                                      bitboard_occupied, 3, time_limit_ms=60_000)
+    assert depth_reached == 3
+    assert move_score(bitboard_player, bitboard_opponent, move, 3) == serial_score(bitboard_player, bitboard_opponent, 3)
+
+def test_thread_pool_shutdown_detaches_the_shared_table(pool):
+    bitboard_player, bitboard_opponent = POSITIONS[0]
+    minimax_algo_parallelize.best_move_lazy_smp(bitboard_player, bitboard_opponent,
+                                                bitboard_player | bitboard_opponent, 2)
+    attached = dict(shared_transposition_table._attached_tables)
+    pool.shutdown()
+    if pool.threads:
+        assert attached
+        assert not shared_transposition_table._attached_tables
+        assert all(table.buffer is None for table in attached.values())
@@ -0,0 +1,10 @@
+import pytest
+
+from perft import BACKENDS, check_backends
+
+# Every move generator against the reference perft counts (perft.py --check)
+
+@pytest.mark.parametrize("backend", list(BACKENDS) + ["numpy"])
+def test_move_generator_perft(backend):
+    if backend not in check_backends(3, [backend]):
+        pytest.skip(f"{backend} is not available here")
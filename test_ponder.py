@@ -0,0 +1,30 @@
+import pytest
+
+import minimax_algo
+from backend_benchmark import benchmark_positions
+from engine_pool import get_engine_pool, shutdown_engine_pool
+from ponder import Ponderer
+from test_parallel_search import move_score, serial_score
+
+@pytest.fixture
+def ponderer(monkeypatch):
+    monkeypatch.setattr(minimax_algo, "use_opening_book", False)
+    monkeypatch.setattr(minimax_algo, "analysis_store_path", None)
+    monkeypatch.setattr(minimax_algo, "use_race_solver", False)
+    # The game's pool is running when the ponder workers are forked (they must leave it alone)
+    get_engine_pool().start()
+    ponderer = Ponderer(replies=2, depth=3)
+    yield ponderer
+    ponderer.close()
+    shutdown_engine_pool()
+
+def test_ponder_hit_plays_like_the_search(ponderer):
+    for bitboard_player, bitboard_opponent in benchmark_positions(3, seed=1):
+        ponderer.start(bitboard_player, bitboard_opponent)
+        predicted_player, predicted_opponent = next(iter(ponderer.predictions))
+        hit, move = ponderer.take(predicted_player, predicted_opponent)
+        assert hit
+        assert move_score(predicted_player, predicted_opponent, move, 3) == \
+            serial_score(predicted_player, predicted_opponent, 3)
+    # The game's pool still works after the ponder workers are gone
+    assert get_engine_pool().map(abs, [-1]) == [1]
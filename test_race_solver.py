@@ -0,0 +1,49 @@
+from bit_board_logic import side_moves, packed_move_masks
+import race_solver
+from race_solver import AI_TARGET, HUMAN_TARGET, RaceSolver, is_disengaged, race_move
+from move_ordering import ai_row_gain
+
+# The solver's distances against a breadth-first search from the filled target. A move of a lone
+# army can be played back (a jump over the same piece), so the search away from the target gives
+# the exact distance of every position it reaches.
+
+def distances_from_target(max_distance):
+    distances = {AI_TARGET: 0}
+    frontier = [AI_TARGET]
+    for distance in range(1, max_distance + 1):
+        next_frontier = []
+        for pieces in frontier:
+            for move in side_moves(pieces, pieces):
+                position = pieces ^ packed_move_masks[move]
+                if position not in distances:
+                    distances[position] = distance
+                    next_frontier.append(position)
+        frontier = next_frontier
+    return distances
+
+BFS_DISTANCES = distances_from_target(3)
+
+def test_race_distances_like_breadth_first_search():
+    solver = RaceSolver(AI_TARGET, ai_row_gain)
+    checked = 0
+    for pieces, distance in sorted(BFS_DISTANCES.items()):
+        if not is_disengaged(pieces, HUMAN_TARGET):
+            continue
+        solved_distance, move = solver.solve(pieces)
+        assert solved_distance == distance
+        if distance:
+            # The first move of the line is one step closer
+            assert BFS_DISTANCES[pieces ^ packed_move_masks[move]] == distance - 1
+        checked += 1
+    assert checked > 100
+
+def test_race_move_is_legal_with_the_human_pieces(monkeypatch):
+    pieces = next(pieces for pieces, distance in BFS_DISTANCES.items()
+                  if distance == 2 and is_disengaged(pieces, HUMAN_TARGET))
+    move, distance = race_move(pieces, HUMAN_TARGET)
+    assert distance == 2
+    assert move in side_moves(pieces, pieces | HUMAN_TARGET)
+    # A move the human pieces make illegal (here one of the human's own) is left to the search
+    illegal_move = side_moves(HUMAN_TARGET, pieces | HUMAN_TARGET)[0]
+    monkeypatch.setattr(race_solver.ai_race_solver, "solve", lambda *args: (2, illegal_move))
+    assert race_move(pieces, HUMAN_TARGET) is None
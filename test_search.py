@@ -0,0 +1,79 @@
+import math
+import random
+
+import pytest
+
+from backend_benchmark import benchmark_positions
+from bit_board_masks import player1_pieces, player2_pieces, ROW_MASKS
+from bit_board_logic import side_moves, play_packed_move
+from eval_cache import EvalCache
+from evaluation import evaluate_full, player_move_delta, opponent_move_delta
+from minimax_algo import minimax
+from move_ordering import MoveOrdering
+from transposition_table import TranspositionTable
+
+# The transposition table, move ordering, incremental evaluation and evaluation cache only make the
+# search faster: the values must stay those of the plain search and of a full evaluation.
+
+def row_evaluation(bitboard_player, bitboard_opponent):
+    """
+    The evaluation row by row, as described in evaluation.py.
+    """
+    score = 0
+    for row, row_mask in enumerate(ROW_MASKS):
+        score += (bitboard_player & row_mask).bit_count() * (50 if row <= 2 else 16 - row)
+        score -= (bitboard_opponent & row_mask).bit_count() * (50 if row >= 14 else row)
+    return score
+
+def random_games(seed, games=20, plies=40):
+    """
+    (AI pieces, human pieces, incrementally updated score) after every ply of random games.
+    """
+    generator = random.Random(seed)
+    for _ in range(games):
+        ai, human = player2_pieces, player1_pieces
+        score = evaluate_full(ai, human)
+        for ply in range(plies):
+            occupied = ai | human
+            if ply % 2 == 0:
+                move = generator.choice(side_moves(human, occupied))
+                _, human = play_packed_move(move, occupied, human)
+                score += opponent_move_delta[move]
+            else:
+                move = generator.choice(side_moves(ai, occupied))
+                _, ai = play_packed_move(move, occupied, ai)
+                score += player_move_delta[move]
+            yield ai, human, score
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_incremental_evaluation_like_full_evaluation(seed):
+    for ai, human, score in random_games(seed):
+        assert score == evaluate_full(ai, human) == row_evaluation(ai, human)
+
+def test_eval_cache_like_uncached_evaluation():
+    positions = [(ai, human) for ai, human, _ in random_games(3)]
+    cache = EvalCache(16)
+    for ai, human in positions:
+        cache.put(ai, human, evaluate_full(ai, human))
+    assert all(cache.get(ai, human) == evaluate_full(ai, human) for ai, human in positions)
+    # A 4 slot cache: stores evict, but a position never gets another one's score
+    small_cache = EvalCache(0)
+    for ai, human in positions:
+        small_cache.put(ai, human, evaluate_full(ai, human))
+    for ai, human in positions:
+        score = small_cache.get(ai, human)
+        assert score is None or score == evaluate_full(ai, human)
+    assert small_cache.evictions > 0
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_table_and_ordering_keep_the_minimax_value(seed):
+    # One table and ordering for all the searches, as between the moves of a game
+    table = TranspositionTable(1 << 12)
+    ordering = MoveOrdering()
+    for ai, human in benchmark_positions(12, seed):
+        for depth in (2, 3):
+            ordering.new_search()
+            plain = minimax(ai, human, ai | human, depth, -math.inf, math.inf, True)
+            assert minimax(ai, human, ai | human, depth, -math.inf, math.inf, True, tt=table,
+                           ordering=ordering) == plain
+            assert minimax(ai, human, ai | human, depth, -math.inf, math.inf, True, ordering=ordering) == plain
@@ -0,0 +1,17 @@
+from shared_transposition_table import SharedTranspositionTable, ENTRY, BUCKET_BYTES
+
+def test_demoted_torn_entry_stays_torn():
+    table = SharedTranspositionTable(16)
+    try:
+        key, other_key = 3, 3 + 16  # same bucket
+        table.store(key, 2, 0, 5, 10)
+        # A write of another process half done: new data, old check word
+        _, data, check = ENTRY.unpack_from(table.buffer, (key & table.index_mask) * BUCKET_BYTES)
+        ENTRY.pack_into(table.buffer, (key & table.index_mask) * BUCKET_BYTES, key, data ^ 1 << 40, check)
+        # A deeper entry takes the depth-preferred slot, the torn one moves to the always-replace slot
+        table.store(other_key, 4, 0, 7, 11)
+        assert table.probe(other_key)[3] == 7
+        assert table.probe(key) is None
+        assert table.torn_reads == 1
+    finally:
+        table.close()
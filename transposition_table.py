@@ -0,0 +1,107 @@
+import random
+
+from bit_board_logic import encode_move, iterate_bits, bit_to_index
+
+# Zobrist hashing
+# Every (side, cell) gets a random 64 bit number and a position is the XOR of the numbers of its
+# pieces, plus SIDE_TO_MOVE_KEY when the AI (bitboard_player) is to move. Playing a move only flips
+# two cells, so the key of a child is key ^ PLAYER_MOVE_KEYS[move] ^ SIDE_TO_MOVE_KEY.
+# The seed is fixed so keys are the same in every process and every run.
+
+ZOBRIST_SEED = 2180
+_zobrist_random = random.Random(ZOBRIST_SEED)
+PLAYER_KEYS = [_zobrist_random.getrandbits(64) for _ in range(81)]
+OPPONENT_KEYS = [_zobrist_random.getrandbits(64) for _ in range(81)]
+SIDE_TO_MOVE_KEY = _zobrist_random.getrandbits(64)
+
+# XOR of the from and to keys of every packed move
+PLAYER_MOVE_KEYS = [0] * (81 << 7)
+OPPONENT_MOVE_KEYS = [0] * (81 << 7)
+for from_index in range(81):
+    for to_index in range(81):
+        PLAYER_MOVE_KEYS[encode_move(from_index, to_index)] = PLAYER_KEYS[from_index] ^ PLAYER_KEYS[to_index]
+        OPPONENT_MOVE_KEYS[encode_move(from_index, to_index)] = OPPONENT_KEYS[from_index] ^ OPPONENT_KEYS[to_index]
+
+def zobrist_hash(bitboard_player, bitboard_opponent, is_maximizing):
+    key = SIDE_TO_MOVE_KEY if is_maximizing else 0
+    for bit in iterate_bits(bitboard_player):
+        key ^= PLAYER_KEYS[bit_to_index(bit)]
+    for bit in iterate_bits(bitboard_opponent):
+        key ^= OPPONENT_KEYS[bit_to_index(bit)]
+    return key
+
+
+# Bound types of a stored score
+EXACT = 0
+LOWER_BOUND = 1  # the search failed high, the real score is >= score
+UPPER_BOUND = 2  # the search failed low, the real score is <= score
+
+class TranspositionTable:
+    """
+    Bounded table of already searched positions, indexed by the low bits of the Zobrist key.
+    Each bucket has two entries: a depth-preferred one that is only replaced by a search at
+    least as deep, and an always-replace one that keeps the most recent search.
+    Entries are (key, depth, flag, score, move) tuples.
+    """
+    def __init__(self, size=1 << 18):
+        if size & (size - 1):
+            raise ValueError("the transposition table size must be a power of two")
+        self.size = size
+        self.index_mask = size - 1
+        self.depth_preferred = [None] * size
+        self.always_replace = [None] * size
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.collisions = 0  # bucket was holding another position
+        self.stores = 0
+        self.replacements = 0  # a different position was overwritten
+
+    def clear(self):
+        self.depth_preferred = [None] * self.size
+        self.always_replace = [None] * self.size
+        self.reset_stats()
+
+    def probe(self, key):
+        self.probes += 1
+        index = key & self.index_mask
+        entry = self.depth_preferred[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        other = self.always_replace[index]
+        if other is not None and other[0] == key:
+            self.hits += 1
+            return other
+        if entry is not None or other is not None:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        self.stores += 1
+        index = key & self.index_mask
+        entry = (key, depth, flag, score, move)
+        current = self.depth_preferred[index]
+        if current is None or current[0] == key or depth >= current[1]:
+            if current is not None and current[0] != key:
+                self.replacements += 1
+                # The deeper slot's old entry still goes to the always-replace slot
+                self.always_replace[index] = current
+            self.depth_preferred[index] = entry
+        else:
+            previous = self.always_replace[index]
+            if previous is not None and previous[0] != key:
+                self.replacements += 1
+            self.always_replace[index] = entry
+
+    def stats(self):
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "replacements": self.replacements,
+        }
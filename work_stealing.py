@@ -0,0 +1,251 @@
+import heapq
+import math
+import threading
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from bit_board_logic import side_moves, play_packed_move
+from minimax_algo import instant_move, record_search
+from minimax_algo_parallelize import minimax, search_options
+from search_statistics import SearchStats
+from engine_pool import get_engine_pool
+
+# Work-stealing subtree scheduler
+# Root subtrees differ a lot in size (a piece with a long jump chain ahead against a backward
+# shuffle), so one task per root move leaves most workers idle while the last big ones finish.
+# Here the tasks wait in one queue in the main process, largest estimate first, and only as many
+# as there are workers are running: a worker that finishes takes (steals) the largest pending task.
+# A pending task is split into the tasks of its children (ply 2, then ply 3) when it is larger
+# than a worker's share of the remaining work, or when there are fewer pending tasks than idle
+# workers. The score of a split task is the min / max of its children, computed when the last
+# one comes back.
+# Every task is searched with the alpha-beta window its ancestors give it when it is sent: the best
+# exact root score so far as alpha, raised by the scores already known at its max ancestors and
+# lowered by those at its min ancestors (see window). A task whose window is already empty is cut
+# without being searched, like the remaining moves of a node after a cutoff. Only a root move
+# scored above every alpha used below it is exact, the others can't beat the best move.
+
+MAX_SPLIT_PLY = 3  # tasks are split down to positions 3 plies below the root at most
+
+def position_after(bitboard_player, bitboard_opponent, path):
+    """
+    (AI pieces, human pieces, occupied) after the moves of 'path', the AI playing first.
+    """
+    bitboard_occupied = bitboard_player | bitboard_opponent
+    for ply, move in enumerate(path):
+        if ply % 2 == 0:
+            bitboard_occupied, bitboard_player = play_packed_move(move, bitboard_occupied, bitboard_player)
+        else:
+            bitboard_occupied, bitboard_opponent = play_packed_move(move, bitboard_occupied, bitboard_opponent)
+    return bitboard_player, bitboard_opponent, bitboard_occupied
+
+def subtree_task(args):
+    """
+    Worker: score of the position after 'path' searched to the root 'depth' within (alpha, beta).
+    Returns (score, SearchStats, worker id, busy seconds), the id is the thread id of the worker
+    (the process id too with a process pool).
+    """
+    bitboard_player, bitboard_opponent, path, depth, alpha, beta = args
+    start = time.perf_counter()
+    bitboard_player, bitboard_opponent, bitboard_occupied = position_after(bitboard_player, bitboard_opponent, path)
+    stats = SearchStats()
+    score = minimax(bitboard_player, bitboard_opponent, bitboard_occupied, depth - len(path), alpha, beta,
+                    len(path) % 2 == 0, stats=stats, **search_options)
+    return score, stats, threading.get_native_id(), time.perf_counter() - start
+
+class SubtreeTask:
+    """
+    A position below the root (the moves of 'path'), searched as one task or split into its children.
+    """
+    __slots__ = ("path", "parent", "estimate", "children_left", "score", "highest_alpha")
+
+    def __init__(self, path, parent, estimate):
+        self.path = path
+        self.parent = parent
+        self.estimate = estimate
+        self.children_left = 0
+        self.score = None  # so far for a split task, None while no child is known
+        self.highest_alpha = -math.inf  # the highest alpha a search below this task used
+
+    @property
+    def is_maximizing(self):
+        return len(self.path) % 2 == 0
+
+class WorkStealingScheduler:
+    """
+    search() runs one root search on the engine pool, report() describes how the workers were used.
+    """
+    def __init__(self, pool=None):
+        self.pool = pool or get_engine_pool()
+        self.best_move = None
+        self.best_score = -math.inf
+        self.report_values = {}
+
+    def window(self, task):
+        """
+        (alpha, beta) of a task: the best root score so far and the scores already known at its ancestors.
+        """
+        alpha, beta = self.best_score, math.inf
+        ancestor = task.parent
+        while ancestor is not None:
+            if ancestor.score is not None:
+                if ancestor.is_maximizing:
+                    alpha = max(alpha, ancestor.score)
+                else:
+                    beta = min(beta, ancestor.score)
+            ancestor = ancestor.parent
+        return alpha, beta
+
+    def estimate(self, bitboard_player, bitboard_opponent, path):
+        """
+        Size guess of the subtree after 'path': the number of moves of the side to move times the
+        number of moves of the other side.
+        """
+        player, opponent, occupied = position_after(bitboard_player, bitboard_opponent, path)
+        moving, waiting = (player, opponent) if len(path) % 2 == 0 else (opponent, player)
+        return len(side_moves(moving, occupied)) * len(side_moves(waiting, occupied))
+
+    def children(self, bitboard_player, bitboard_opponent, task):
+        player, opponent, occupied = position_after(bitboard_player, bitboard_opponent, task.path)
+        moving = player if task.is_maximizing else opponent
+        return [SubtreeTask(task.path + (move,), task, self.estimate(bitboard_player, bitboard_opponent,
+                                                                       task.path + (move,)))
+                for move in side_moves(moving, occupied)]
+
+    def search(self, bitboard_player, bitboard_opponent, depth, stats=None):
+        """
+        (best packed move, its score), (None, -inf) without a move.
+        """
+        start = time.perf_counter()
+        workers = self.pool.workers
+        self.best_move, self.best_score = None, -math.inf
+        occupied = bitboard_player | bitboard_opponent
+        roots = [SubtreeTask((move,), None, self.estimate(bitboard_player, bitboard_opponent, (move,)))
+                 for move in side_moves(bitboard_player, occupied)]
+        pending = []  # heap of (-estimate, order, task)
+        order = 0
+        for task in roots:
+            heapq.heappush(pending, (-task.estimate, order, task))
+            order += 1
+        pending_estimate = sum(task.estimate for task in roots)
+        running = {}  # future -> task
+        busy = {}  # worker id -> [busy seconds, tasks]
+        durations = []
+        splits = 0
+        cutoffs = 0
+        drain_time = None  # first time a worker was left with nothing to do
+
+        while pending or running:
+            while pending and len(running) < workers:
+                _, _, task = heapq.heappop(pending)
+                pending_estimate -= task.estimate
+                alpha, beta = self.window(task)
+                if alpha >= beta:
+                    cutoffs += 1
+                    self.finish(task, None, alpha)
+                    continue
+                idle = workers - len(running)
+                fair_share = (pending_estimate + task.estimate) / workers
+                if (len(task.path) < MAX_SPLIT_PLY and depth - len(task.path) >= 2
+                        and (task.estimate > fair_share or len(pending) + 1 < idle)):
+                    children = self.children(bitboard_player, bitboard_opponent, task)
+                    if children:
+                        splits += 1
+                        task.children_left = len(children)
+                        for child in children:
+                            heapq.heappush(pending, (-child.estimate, order, child))
+                            order += 1
+                            pending_estimate += child.estimate
+                        continue
+                future = self.pool.submit(subtree_task, (bitboard_player, bitboard_opponent, task.path, depth,
+                                                         alpha, beta))
+                task.highest_alpha = alpha
+                running[future] = task
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                score, task_stats, worker_id, seconds = future.result()
+                if stats is not None:
+                    stats.merge(task_stats)
+                worker = busy.setdefault(worker_id, [0.0, 0])
+                worker[0] += seconds
+                worker[1] += 1
+                durations.append(seconds)
+                self.finish(task, score, task.highest_alpha)
+            if drain_time is None and not pending and len(running) < workers:
+                drain_time = time.perf_counter()
+
+        wall = time.perf_counter() - start
+        durations.sort()
+        self.report_values = {
+            "wall": wall,
+            "tasks": len(durations),
+            "splits": splits,
+            "cutoffs": cutoffs,
+            "utilization": {worker_id: round(seconds / wall, 3) if wall > 0 else 0.0
+                            for worker_id, (seconds, _) in busy.items()},
+            "tasks_per_worker": {worker_id: count for worker_id, (_, count) in busy.items()},
+            "task_p50": durations[len(durations) // 2] if durations else 0.0,
+            "task_p95": durations[min(len(durations) - 1, int(len(durations) * 0.95))] if durations else 0.0,
+            "task_max": durations[-1] if durations else 0.0,
+            # From the first worker left without work to the end of the search
+            "tail_latency": time.perf_counter() - drain_time if drain_time is not None else 0.0,
+        }
+        return self.best_move, self.best_score
+
+    def finish(self, task, score, alpha):
+        """
+        A task is done with 'score' (None when cut) searched with at most 'alpha': hand them to its
+        parent, which is done after its last child. A root move done with an exact score may be the best one.
+        """
+        task.score = score
+        task.highest_alpha = alpha
+        while task.parent is not None:
+            parent = task.parent
+            if score is not None:
+                if parent.score is None:
+                    parent.score = score
+                elif parent.is_maximizing:
+                    parent.score = max(parent.score, score)
+                else:
+                    parent.score = min(parent.score, score)
+            parent.highest_alpha = max(parent.highest_alpha, alpha)
+            parent.children_left -= 1
+            if parent.children_left:
+                return
+            task, score, alpha = parent, parent.score, parent.highest_alpha
+        if score is not None and score > alpha and score > self.best_score:
+            self.best_move, self.best_score = task.path[0], score
+
+    def report(self):
+        return self.report_values
+
+def best_move_work_stealing(bitboard_player, bitboard_opponent, bitboard_occupied, depth=4, verbose=False,
+                            stats=None):
+    """
+    best_move_parallelized with the work-stealing scheduler. The counters of all the tasks are added
+    to 'stats' when one is passed.
+    """
+    start = time.perf_counter()
+    if stats is None:
+        stats = SearchStats()
+
+    known = instant_move(bitboard_player, bitboard_opponent, verbose, depth)
+    if known is not None:
+        stats.depth_reached = known[1]
+        stats.race_distance = known[2]
+        return known[0]
+
+    scheduler = WorkStealingScheduler()
+    best_move_choice, best_score = scheduler.search(bitboard_player, bitboard_opponent, depth, stats)
+
+    stats.elapsed += time.perf_counter() - start
+    stats.iteration_times.append([depth, time.perf_counter() - start])
+    stats.depth_reached = depth
+    record_search(bitboard_player, bitboard_opponent, best_move_choice, best_score, depth)
+    if verbose:
+        print()
+        print("Work-stealing search stats:", stats.to_json())
+        print("Scheduler:", scheduler.report())
+    return best_move_choice